@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+Writes (and time) taken by typer() on 2000 characters at 1 ms
+each, against the old write, flush and sleep per character, and
+writes per frame for 20 marquees animated at once on a Screen.
+
+    python benchmarks/bench_animation.py
+"""
+
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import club
+
+TEXT = 'All work and no play makes Jack a dull boy. ' * 45
+
+
+class CountingWriter(io.StringIO):
+    writes = 0
+
+    def write(self, data):
+        self.writes += 1
+        return super().write(data)
+
+
+def per_character(text, delay, out):
+    for char in text:
+        out.write(char)
+        out.flush()
+        time.sleep(delay)
+
+
+def main():
+    for name, function in (('sleep per character', per_character), ('typer()', club.typer)):
+        out = CountingWriter()
+        begin = time.perf_counter()
+        function(TEXT, 0.001, out)
+        print(f"{name:<20} {time.perf_counter() - begin:6.2f} s  {out.writes:5d} writes")
+
+    out = CountingWriter()
+    animator = club.Animator(30, screen=club.Screen(120, 20, out))
+    for row in range(20):
+        animator.add(club.Marquee(f'region {row} is scrolling', 40, 0.01 * (row + 1), duration=1, x=row % 3 * 40, y=row))
+    animator.run()
+    print(f"20 marquees          {animator.frames} frames  {out.writes:5d} writes  {len(out.getvalue()) / animator.frames:.0f} bytes/frame")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+ArgumentParser.parse_args() on argument lists of up to 10^5 entries,
+the way xargs invokes a tool with thousands of files.
+
+    python benchmarks/bench_argparse.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import club
+
+
+def make_parser(argv):
+    parser = club.ArgumentParser(argv)
+    parser.add_argument(['-v', '--verbose'], 'verbose', count=True)
+    parser.add_argument(['-q', '--quiet'], 'quiet')
+    parser.add_option(['-o', '--output'], 'output')
+    parser.add_option(['-j', '--jobs'], 'jobs', type_=int, defaultval=1)
+    parser.add_option(['-I', '--include'], 'include', append=True)
+    for i in range(50):
+        parser.add_option([f'--extra-{i}'], f'extra_{i}')
+    return parser
+
+
+def main():
+    print(f"{'argv':>7} {'parse s':>8} {'us/arg':>7}")
+    for n in (10 ** 3, 10 ** 4, 10 ** 5):
+        argv = ['tool', '-vv', '--output=out.txt', '-j', '8']
+        for i in range(n - len(argv)):
+            argv.append(f'-Isrc/{i}' if i % 10 == 0 else f'src/file_{i}.c')
+        parser = make_parser(argv)
+        begin = time.perf_counter()
+        parser.parse_args()
+        elapsed = time.perf_counter() - begin
+        print(f"{n:>7} {elapsed:>8.4f} {elapsed / n * 1e6:>7.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark of the compiled case engine against the old
+per-word elif chain that fancyprint() used to run.
+
+    python benchmarks/bench_case.py
+"""
+
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import club
+
+ARGS = ("Hello, I'm", 69, "years old and counting", "status: ok")
+CASES = ['normal', 'camel', 'train', 'sentence', 'leet', 'pascal', 'snake', 'flat', 'spinal',
+         'macro', 'cobol', 'kebab', 'upper', 'lower', 'random', 'sticky']
+NUMBER = 20000
+
+
+def _strip(string):
+    return string.replace(',','').replace('-','').replace('\'','').replace('\"','').replace('<','').replace('>','').replace('_','').replace('!','').replace('?','').replace('$','').replace('%','').replace('@','').replace('^','').replace('&','').replace('*','').replace('`','').replace('~','').replace('\\','').replace('/','').replace('{','').replace('}','').replace('[','').replace(']','').replace(':','').replace(';','').replace('+','').replace('=','')
+
+
+def _leet(string):
+    return string.replace('e','3').replace('E','3').replace('i','1').replace('I','1').replace('s','5').replace('S','5').replace('z','2').replace('Z','2').replace('a','4').replace('A','4').replace('b','8').replace('B','8').replace('o','0').replace('O','0')
+
+
+def _sticky(string):
+    out = []
+    for char in string:
+        if char.isupper():
+            out.append(char.lower())
+        elif char.islower():
+            out.append(char.upper())
+        else:
+            out.append(char)
+    return ''.join(out)
+
+
+def legacy(args, case, sep=' '):
+    """
+    The word splitting and transformation of the old elif chain.
+    """
+    args2 = []
+    for arg in args:
+        for argument in str(arg).split(' '):
+            args2.append(argument)
+
+    if case == 'camel':
+        return ''.join([args2[0][0].lower() + args2[0][1:]] + [s[0].upper() + s[1:] for s in map(_strip, args2[1:])])
+    elif case == 'train':
+        return '-'.join([args2[0][0].upper() + args2[0][1:]] + [s.lower() for s in args2[1:]])
+    elif case == 'sentence':
+        return sep.join([args2[0][0].upper() + args2[0][1:]] + args2[1:])
+    elif case == 'leet':
+        return sep.join([_leet(s) for s in args2])
+    elif case == 'pascal':
+        return ''.join([s[0].upper() + s[1:] for s in args2])
+    elif case == 'snake':
+        return '_'.join([s.lower() for s in args2])
+    elif case == 'flat':
+        return ''.join([s.lower() for s in args2])
+    elif case in ('spinal', 'kebab'):
+        return '-'.join([s.lower() for s in args2])
+    elif case == 'macro':
+        return '_'.join([s.upper() for s in args2])
+    elif case == 'cobol':
+        return '-'.join([s.upper() for s in args2])
+    elif case == 'upper':
+        return sep.join([s.upper() for s in args2])
+    elif case == 'lower':
+        return sep.join([s.lower() for s in args2])
+    elif case == 'random':
+        return sep.join([''.join([random.choice([c.upper(), c.lower()]) for c in s]) for s in args2])
+    elif case == 'sticky':
+        return sep.join([_sticky(s) for s in args2])
+    return sep.join([''.join(word) for word in args2])
+
+
+def compiled(args, case, sep=' '):
+    return club.convert_case(' '.join([str(arg) for arg in args]), case, sep)
+
+
+def main():
+    print(f"{'case':<10} {'legacy us':>10} {'compiled us':>12} {'speedup':>8}")
+    for case in CASES:
+        old = timeit.timeit(lambda: legacy(ARGS, case), number=NUMBER) / NUMBER * 1e6
+        new = timeit.timeit(lambda: compiled(ARGS, case), number=NUMBER) / NUMBER * 1e6
+        print(f"{case:<10} {old:>10.2f} {new:>12.2f} {old / new:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+Write throughput of DevNull against a real open(os.devnull).
+
+    python benchmarks/bench_devnull.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import club
+
+N = 10 ** 6
+LINE = 'a chatty library says hello\n'
+
+
+def run(sink):
+    write = sink.write
+    begin = time.perf_counter()
+    for _ in range(N):
+        write(LINE)
+    sink.flush()
+    writes = time.perf_counter() - begin
+
+    begin = time.perf_counter()
+    for _ in range(N // 10):
+        print('status', 42, 'ok', file=sink)
+    prints = time.perf_counter() - begin
+    return writes, prints
+
+
+def main():
+    print(f"{'sink':<20} {'Mwrites/s':>10} {'Mprints/s':>10}")
+    with open(os.devnull, 'w') as real, club.DevNull() as null:
+        for name, sink in (('open(os.devnull)', real), ('club.DevNull()', null)):
+            writes, prints = run(sink)
+            print(f"{name:<20} {N / writes / 1e6:>10.2f} {N / 10 / prints / 1e6:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+Running 200 short shell commands one after another with
+subprocess.run() and through execute_many() (32 at a time).
+
+    python benchmarks/bench_execute.py
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import club
+
+N = 200
+COMMAND = 'sleep 0.01; echo done'
+
+
+def main():
+    begin = time.perf_counter()
+    for _ in range(N):
+        subprocess.run(COMMAND, shell=True, capture_output=True)
+    print(f"subprocess.run, one by one  {time.perf_counter() - begin:6.2f} s")
+
+    begin = time.perf_counter()
+    results = club.execute_many([COMMAND] * N, limit=32)
+    assert all(result.ok for result in results)
+    print(f"execute_many(limit=32)      {time.perf_counter() - begin:6.2f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+Per-call latency of fancyprint() against heap size, with the default
+gc policy and with a forced collection after every call (the old
+behaviour).
+
+    python benchmarks/bench_gc.py
+"""
+
+import gc
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import club
+
+CALLS = 200
+
+
+def per_call(calls=CALLS):
+    out = io.StringIO()
+    begin = time.perf_counter()
+    for i in range(calls):
+        club.fancyprint('status', i, 'ok', file=out)
+    return (time.perf_counter() - begin) / calls * 1e6
+
+
+def main():
+    heap = []
+    print(f"{'live objects':>12} {'explicit us':>12} {'every=1 us':>12}")
+    for size in (10 ** 4, 10 ** 5, 10 ** 6):
+        heap.extend([object()] for _ in range(size - len(heap)))
+        club.set_gc_policy(club.GCPolicy.EXPLICIT)
+        lazy = per_call()
+        club.set_gc_policy(club.GCPolicy.EVERY, every=1)
+        forced = per_call(calls=CALLS // 10)
+        print(f"{len(gc.get_objects()):>12} {lazy:>12.2f} {forced:>12.2f}")
+    club.set_gc_policy(club.GCPolicy.EXPLICIT)
+
+
+if __name__ == '__main__':
+    main()
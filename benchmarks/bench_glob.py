@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+glob() over a generated tree of 10^6 files (1000 directories of 1000
+files), against the old os.walk + fnmatch implementation.
+
+    python benchmarks/bench_glob.py [files]
+
+The tree is created in a temporary directory and removed afterwards.
+"""
+
+import fnmatch
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import club
+
+
+def legacy_glob(root, pattern):
+    for base, dirs, files in os.walk(root):
+        for filename in fnmatch.filter(files, pattern):
+            yield os.path.join(base, filename)
+
+
+def make_tree(root, files):
+    per_dir = 1000
+    for d in range(max(files // per_dir, 1)):
+        path = os.path.join(root, ('src', 'lib', 'build', 'docs')[d % 4], f'pkg{d // 40}', f'mod{d}')
+        os.makedirs(path, exist_ok=True)
+        for f in range(min(per_dir, files)):
+            open(os.path.join(path, f'file{f}{(".py", ".c", ".txt", ".o")[f % 4]}'), 'w').close()
+
+
+def timed(label, results):
+    begin = time.perf_counter()
+    count = sum(1 for _ in results)
+    print(f"{label:<42} {time.perf_counter() - begin:>7.2f} s {count:>9} matches")
+
+
+def main():
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 6
+    root = tempfile.mkdtemp()
+    try:
+        begin = time.perf_counter()
+        make_tree(root, files)
+        print(f"created {files} files in {time.perf_counter() - begin:.1f} s")
+
+        timed("legacy os.walk + fnmatch '*.py'", legacy_glob(root, '*.py'))
+        timed("glob '*.py'", club.glob(root, '*.py'))
+        timed("glob '*.py' threads=8", club.glob(root, '*.py', threads=8))
+        timed("glob ['*.py', '*.c'] exclude build/**", club.glob(root, ['*.py', '*.c'], exclude=['build/**']))
+        timed("glob 'src/**/*.py' (prunes other trees)", club.glob(root, 'src/**/*.py'))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
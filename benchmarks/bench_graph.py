@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Graph searches on generated graphs of 10^5 nodes: a random sparse
+graph and a weighted grid (for A* with a manhattan heuristic).
+
+    python benchmarks/bench_graph.py
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import club
+
+N = 10 ** 5
+
+
+def random_graph(n, degree=4):
+    nodes = [club.Graph(str(i)) for i in range(n)]
+    for node in nodes:
+        for other in random.sample(nodes, degree):
+            if other is not node:
+                node.add_arc(other, random.randint(1, 10))
+    return nodes
+
+
+def grid_graph(side):
+    nodes = [[club.Graph(f'{x},{y}', (x, y)) for y in range(side)] for x in range(side)]
+    for x in range(side):
+        for y in range(side):
+            for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+                if 0 <= x + dx < side and 0 <= y + dy < side:
+                    nodes[x][y].add_arc(nodes[x + dx][y + dy], random.randint(1, 3))
+    return nodes
+
+
+def manhattan(node, goal):
+    return abs(node.data[0] - goal.data[0]) + abs(node.data[1] - goal.data[1])
+
+
+def timed(label, func):
+    begin = time.perf_counter()
+    result = func()
+    print(f"{label:<34} {time.perf_counter() - begin:>8.3f} s")
+    return result
+
+
+def main():
+    nodes = timed(f'build random graph ({N} nodes)', lambda: random_graph(N))
+    start, goal = nodes[0], nodes[-1]
+    timed('bfs', lambda: start.bfs(goal))
+    timed('dijkstra', lambda: start.dijkstra(goal))
+    timed('5 shortest paths (lazy)', lambda: list(zip(range(5), start.shortest_paths(goal))))
+
+    side = int(N ** 0.5)
+    grid = timed(f'build grid ({side}x{side})', lambda: grid_graph(side))
+    start, goal = grid[0][0], grid[-1][-1]
+    timed('dijkstra corner to corner', lambda: start.dijkstra(goal))
+    timed('astar corner to corner', lambda: start.astar(goal, manhattan))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+Import cost of club, measured with python -X importtime.
+
+Exits with status 1 if importing club pulls in one of the modules it
+is supposed to load lazily, so it can be used as a regression check.
+
+    python benchmarks/bench_import.py
+"""
+
+import os
+import py_compile
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+RUNS = 15
+DEFERRED = ('subprocess', 'termios', 'tty', 'pickle', 'fnmatch', 'random', 'enum')
+
+
+def importtime():
+    """
+    Returns {module: (self us, cumulative us)} for one fresh import of club.
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    err = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import club'],
+                         env=env, stderr=subprocess.PIPE, check=True, text=True).stderr
+    times = {}
+    for line in err.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(own), int(cumulative))
+    return times
+
+
+def main():
+    # Measure the import, not the compile of club.py.
+    py_compile.compile(os.path.join(ROOT, 'club.py'))
+
+    runs = [importtime() for _ in range(RUNS)]
+    club = [run['club'] for run in runs]
+    print(f"import club: {statistics.median(c for _, c in club) / 1000:.2f} ms cumulative, "
+          f"{statistics.median(o for o, _ in club) / 1000:.2f} ms in club itself (median of {RUNS})")
+
+    # Modules imported because of club (not by interpreter start up).
+    imported = set(runs[-1]) - {'club'}
+    startup = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'pass'],
+                             stderr=subprocess.PIPE, check=True, text=True).stderr
+    for line in startup.splitlines():
+        if line.startswith('import time:') and 'cumulative' not in line:
+            imported.discard(line.split('|')[-1].strip())
+    print("pulled in by club:", ', '.join(sorted(imported)) or 'nothing')
+
+    eager = sorted(set(runs[-1]) & set(DEFERRED))
+    if eager:
+        print("regression, imported eagerly:", ', '.join(eager))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
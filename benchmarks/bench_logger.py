@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+Logging 10^6 records to a file with the default flush per record,
+with buffering and with the background writer thread.
+
+    python benchmarks/bench_logger.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import club
+
+N = 10 ** 6
+
+
+def run(**options):
+    with tempfile.TemporaryFile('w') as file:
+        logger = club.Logger(file)
+        logger.config(format='{asctime} #{line}: ', **options)
+        log = logger.log
+        begin = time.perf_counter()
+        for i in range(N):
+            log(i)
+        caller = time.perf_counter() - begin
+        logger.flush()
+        total = time.perf_counter() - begin
+        logger.config(background=False)
+    return caller, total
+
+
+def main():
+    print(f"{'mode':<24} {'log() s':>8} {'total s':>8} {'records/s':>10}")
+    for name, options in (('flush per record', {}),
+                          ('buffering=1000', {'buffering': 1000}),
+                          ('background thread', {'background': True})):
+        caller, total = run(**options)
+        print(f"{name:<24} {caller:>8.2f} {total:>8.2f} {N / total:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Bytes written per frame by Screen.refresh() against a full redraw,
+for a 120x40 dashboard (a clock, changing counters, a progress bar
+and a scrolling log) over 300 frames.
+
+    python benchmarks/bench_screen.py
+"""
+
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import club
+
+WIDTH, HEIGHT = 120, 40
+FRAMES = 300
+RED = '\33[31m'
+GREEN = '\33[32m'
+BOLD = '\33[1m'
+
+
+def draw(screen, frame, log):
+    screen.put(0, 0, ' club dashboard '.center(WIDTH, '='), BOLD)
+    screen.put(0, 1, f'frame {frame:6d}  time {frame / 30:8.2f} s')
+    for i in range(8):
+        screen.put(2, 3 + i, f'worker {i}: {frame * (i + 1) % 9973:6d} requests', GREEN if i % 2 else '')
+    done = frame * (WIDTH - 2) // FRAMES
+    screen.put(0, 12, '[' + '#' * done + ' ' * (WIDTH - 2 - done) + ']', RED)
+    if frame % 10 == 0:
+        log.append(f'{frame:6d} something happened')
+        for row, line in enumerate(log[-(HEIGHT - 14):]):
+            screen.put(0, 14 + row, line.ljust(WIDTH))
+
+
+def main():
+    file = io.StringIO()
+    screen = club.Screen(WIDTH, HEIGHT, file)
+    log = []
+    diffed = full = 0
+    begin = time.perf_counter()
+    for frame in range(FRAMES):
+        draw(screen, frame, log)
+        full += len(screen.render(full=True)) + len('\33[2J')
+        diffed += screen.refresh()
+    elapsed = time.perf_counter() - begin
+
+    print(f"full redraw      {full / FRAMES:8.0f} bytes/frame")
+    print(f"Screen.refresh() {diffed / FRAMES:8.0f} bytes/frame ({full / diffed:.0f}x less)")
+    print(f"{elapsed / FRAMES * 1000:.2f} ms/frame to draw, render and refresh")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""
+Bulk union and intersection of 10^6 element Sets against native sets.
+
+    python benchmarks/bench_set.py
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import club
+
+N = 10 ** 6
+
+
+def main():
+    a, b = set(range(N)), set(range(N // 2, N + N // 2))
+    sa, sb = club.Set(a), club.Set(b)
+    oa, ob = club.Set(range(N), ordered=True), club.Set(range(N // 2, N + N // 2), ordered=True)
+
+    cases = (
+        ('union', lambda: a | b, lambda: sa | sb, lambda: oa | ob),
+        ('intersection', lambda: a & b, lambda: sa & sb, lambda: oa & ob),
+        ('in-place union', lambda: set(a).update(b), lambda: club.Set(sa).__ior__(sb), None),
+    )
+    print(f"{'operation':<15} {'set s':>7} {'Set s':>7} {'ordered s':>10}")
+    for name, native, wrapped, ordered in cases:
+        native = min(timeit.repeat(native, number=1, repeat=3))
+        wrapped = min(timeit.repeat(wrapped, number=1, repeat=3))
+        ordered = min(timeit.repeat(ordered, number=1, repeat=3)) if ordered else float('nan')
+        print(f"{name:<15} {native:>7.3f} {wrapped:>7.3f} {ordered:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+Logging 10^6 records (flushed after every one) to a plain file and
+to a RotatingFileSink, then reading the history back.
+
+    python benchmarks/bench_sink.py
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import club
+
+N = 10 ** 6
+
+
+def run(directory, sink):
+    path = os.path.join(directory, 'bench.log')
+    file = club.RotatingFileSink(path, max_bytes=16 * 1024 * 1024) if sink else open(path, 'w')
+    logger = club.Logger(file)
+    logger.config(format='{asctime} #{line}: ')
+    log = logger.log
+    begin = time.perf_counter()
+    for i in range(N):
+        log(i)
+    logged = time.perf_counter() - begin
+    begin = time.perf_counter()
+    lines = sum(1 for _ in logger.get_log_history(stream=True))
+    read = time.perf_counter() - begin
+    logger.close()
+    return logged, read, lines
+
+
+def main():
+    print(f"{'file':<20} {'log s':>8} {'history s':>10} {'lines':>8}")
+    for name, sink in (('plain file', False), ('RotatingFileSink', True)):
+        directory = tempfile.mkdtemp()
+        try:
+            logged, read, lines = run(directory, sink)
+        finally:
+            shutil.rmtree(directory)
+        print(f"{name:<20} {logged:>8.2f} {read:>10.2f} {lines:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+Stack push/pop scaling, up to 10^6 operations. The time per
+operation should stay flat as n grows.
+
+    python benchmarks/bench_stack.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import club
+
+
+def run(n):
+    stack = club.Stack()
+    push, pop = stack.push, stack.pop
+    begin = time.perf_counter()
+    for i in range(n):
+        push(i)
+    for _ in range(n):
+        pop()
+    single = time.perf_counter() - begin
+
+    begin = time.perf_counter()
+    stack.push_many(range(n))
+    stack.pop_many(n)
+    bulk = time.perf_counter() - begin
+    return single, bulk
+
+
+def main():
+    print(f"{'n':>8} {'push+pop s':>11} {'ns/op':>7} {'bulk s':>8}")
+    for n in (10 ** 4, 10 ** 5, 10 ** 6):
+        single, bulk = run(n)
+        print(f"{n:>8} {single:>11.4f} {single / (2 * n) * 1e9:>7.1f} {bulk:>8.4f}")
+
+
+if __name__ == '__main__':
+    main()
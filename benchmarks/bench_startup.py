@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Cold start of "tool sub --help" for a CLI with 20 subcommands, each
+pulling in heavy modules, registered lazily with add_subcommand()
+against importing every subcommand up front.
+
+    python benchmarks/bench_startup.py
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+COMMANDS = 20
+RUNS = 10
+
+COMMAND = '''
+import asyncio, decimal, email.mime.multipart, http.client, json, sqlite3, xml.dom.minidom
+
+def main(argv):
+    return 0
+'''
+
+LAZY = '''
+import club
+parser = club.ArgumentParser(__import__('sys').argv)
+parser.add_help('usage: tool COMMAND')
+for i in range({commands}):
+    parser.add_subcommand(f'sub{{i}}', f'tool_commands.sub{{i}}:main', help=f'Subcommand {{i}}')
+parser.dispatch()
+'''
+
+EAGER = '''
+import club, importlib
+parser = club.ArgumentParser(__import__('sys').argv)
+parser.add_help('usage: tool COMMAND')
+commands = {{f'sub{{i}}': importlib.import_module(f'tool_commands.sub{{i}}') for i in range({commands})}}
+parser.parse_args()
+'''
+
+
+def run_bare(cwd):
+    begin = time.perf_counter()
+    subprocess.run([sys.executable, '-c', 'pass'], cwd=cwd, check=True)
+    return time.perf_counter() - begin
+
+
+def run(script, cwd):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([ROOT, cwd]))
+    times = []
+    for _ in range(RUNS):
+        begin = time.perf_counter()
+        subprocess.run([sys.executable, script, 'sub3', '--help'], cwd=cwd, env=env,
+                       stdout=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - begin)
+    return statistics.median(times)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        package = os.path.join(tmp, 'tool_commands')
+        os.mkdir(package)
+        open(os.path.join(package, '__init__.py'), 'w').close()
+        for i in range(COMMANDS):
+            with open(os.path.join(package, f'sub{i}.py'), 'w') as fp:
+                fp.write(COMMAND)
+        for name, source in (('lazy.py', LAZY), ('eager.py', EAGER)):
+            with open(os.path.join(tmp, name), 'w') as fp:
+                fp.write(source.format(commands=COMMANDS))
+
+        # Warm the bytecode caches so both sides pay the same compile cost.
+        run('eager.py', tmp)
+        bare = statistics.median([run_bare(tmp) for _ in range(RUNS)])
+        print(f"python -c pass:        {bare * 1000:>7.1f} ms")
+        print(f"eager sub --help:      {run('eager.py', tmp) * 1000:>7.1f} ms")
+        print(f"lazy sub --help:       {run('lazy.py', tmp) * 1000:>7.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
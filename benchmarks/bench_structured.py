@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Logging 10^6 records as text and as structured records (packed
+into a binary file), then reading the last tenth of them back by
+time with read_log().
+
+    python benchmarks/bench_structured.py
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import club
+
+N = 10 ** 6
+
+
+def run(path, mode, **options):
+    with open(path, mode) as file:
+        logger = club.Logger(file)
+        logger.config(format='{asctime} #{line}: ', buffering=1000, **options)
+        log = logger.log
+        begin = time.perf_counter()
+        for i in range(N):
+            if i == N - N // 10:
+                tail = time.time()
+            log('record {}', i)
+        logger.flush()
+        elapsed = time.perf_counter() - begin
+        logger.config(file=sys.stdout)
+    return elapsed, tail
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'bench.log')
+        text, _ = run(path, 'w')
+        print(f"text records       {text:6.2f} s  {N / text:10.0f} records/s")
+        structured, tail = run(path, 'wb', structured=True)
+        print(f"structured records {structured:6.2f} s  {N / structured:10.0f} records/s")
+
+        begin = time.perf_counter()
+        found = sum(1 for _ in club.read_log(path, start=tail))
+        print(f"read_log last 10%  {time.perf_counter() - begin:6.2f} s  {found} records")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
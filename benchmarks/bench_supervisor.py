@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+A dummy TCP echo service under Supervisor: requests per second
+with one worker and with one per CPU, at least 4 (each request
+burns a little CPU), then a worker is killed to check that it comes back.
+
+    python benchmarks/bench_supervisor.py
+"""
+
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import club
+
+CLIENTS = 16
+REQUESTS = 200
+
+
+def echo(server):
+    while True:
+        client, _ = server.accept()
+        with client:
+            while True:
+                data = client.recv(4096)
+                if not data:
+                    break
+                sum(range(20000))
+                client.sendall(data)
+
+
+def hammer(address):
+    def client():
+        with socket.create_connection(address) as connection:
+            for _ in range(REQUESTS):
+                connection.sendall(b'ping')
+                connection.recv(4096)
+
+    threads = [threading.Thread(target=client) for _ in range(CLIENTS)]
+    begin = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return CLIENTS * REQUESTS / (time.perf_counter() - begin)
+
+
+def start(workers):
+    supervisor = club.Supervisor(echo, workers=workers, address=('127.0.0.1', 0))
+    pid = os.fork()
+    if not pid:
+        supervisor.run()
+        os._exit(0)
+    address = supervisor.socket.getsockname()
+    supervisor.socket.close()
+    time.sleep(0.2)
+    return pid, address
+
+
+def stop(pid):
+    os.kill(pid, signal.SIGTERM)
+    os.waitpid(pid, 0)
+
+
+def main():
+    workers = max(os.cpu_count() or 1, 4)
+    for count in sorted({1, workers}):
+        pid, address = start(count)
+        print(f"{count:>2} worker(s)  {hammer(address):8.0f} requests/s")
+        if count == workers:
+            before = club.process_tree(pid)
+            os.kill(before[0], signal.SIGKILL)
+            time.sleep(0.3)
+            after = club.process_tree(pid)
+            print(f"killed worker {before[0]}, {len(after)} of {count} running again")
+        stop(pid)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+BinaryTree inserts and lookups on sorted and random input, against
+the old unbalanced recursive tree.
+
+    python benchmarks/bench_tree.py
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import club
+
+
+class LegacyEmptyNode(object):
+    def lookup(self, value):
+        return False
+
+    def insert(self, value):
+        return LegacyBinaryNode(self, value, self)
+
+
+class LegacyBinaryNode(object):
+    def __init__(self, left, value, right):
+        self.data, self.left, self.right = value, left, right
+
+    def lookup(self, value):
+        if self.data == value:
+            return True
+        elif self.data > value:
+            return self.left.lookup(value)
+        else:
+            return self.right.lookup(value)
+
+    def insert(self, value):
+        if self.data > value:
+            self.left = self.left.insert(value)
+        elif self.data < value:
+            self.right = self.right.insert(value)
+        return self
+
+
+class LegacyBinaryTree(object):
+    def __init__(self):
+        self.tree = LegacyEmptyNode()
+
+    def lookup(self, value):
+        return self.tree.lookup(value)
+
+    def insert(self, value):
+        self.tree = self.tree.insert(value)
+
+
+def run(tree, values):
+    begin = time.perf_counter()
+    for value in values:
+        tree.insert(value)
+    for value in values:
+        tree.lookup(value)
+    return time.perf_counter() - begin
+
+
+def main():
+    # The legacy tree recurses once per level, a sorted run of n values needs n frames.
+    sys.setrecursionlimit(10 ** 5)
+    print(f"{'input':<7} {'n':>7} {'legacy s':>9} {'avl s':>8}")
+    for n in (1000, 5000, 20000):
+        for name, values in (('sorted', list(range(n))), ('random', random.sample(range(n * 10), n))):
+            legacy = run(LegacyBinaryTree(), values) if name == 'random' or n <= 5000 else float('nan')
+            print(f"{name:<7} {n:>7} {legacy:>9.4f} {run(club.BinaryTree(), values):>8.4f}")
+
+    values = list(range(10 ** 6))
+    begin = time.perf_counter()
+    club.BinaryTree().bulk_load(values)
+    print(f"bulk_load of 10^6 sorted values: {time.perf_counter() - begin:.3f} s")
+
+
+if __name__ == '__main__':
+    main()
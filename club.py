@@ -1,13 +1,11 @@
 # -*- coding: utf-8 -*-
 
-from enum import Enum
-import subprocess
-import termios
-import fnmatch
-import pickle
-import random
+from collections.abc import Mapping, MutableMapping
+from collections import deque
+import functools
+import bisect
+import heapq
 import time
-import tty
 import sys
 import os
 import gc
@@ -35,35 +33,164 @@ class CommandlineError(OSError):
     pass
 
 
-def is_color_supported(file=sys.stdout):
+class TerminalCapabilities(object):
     """
-    Returns true if color in supported by stdout/the given io stream
+    What the terminal behind an io stream can do.
+
+    Use TerminalCapabilities.get(file) instead of creating these
+    directly, the result is probed once and cached per stream until
+    invalidate() is called. After watch_resize() the widths are
+    also kept up to date when the window is resized (SIGWINCH).
     """
+    NONE = 0
+    COLOR_16 = 16
+    COLOR_256 = 256
+    TRUECOLOR = 16777216
 
-    # Code from https://github.com/lepture/terminal/blob/master/terminal/color.py
+    _cache = None
+    _resize_hooked = False
 
-    if not hasattr(file, 'isatty'):
-        return False
+    def __init__(self, fd=None, isatty=False):
+        self.fd = fd
+        self.isatty = isatty
+        self.colors = self._probe_colors(isatty)
+        self.width = self._probe_width(fd, isatty)
 
-    if not file.isatty() and 'TERMINAL-COLOR' not in os.environ:
-        return False
+    def __repr__(self):
+        return f'<TerminalCapabilities fd={self.fd} isatty={self.isatty} colors={self.colors} width={self.width}>'
+
+    @classmethod
+    def get(cls, file=sys.stdout):
+        """
+        Returns the cached capabilities of the given io stream.
+        """
+        cache = cls._cache
+        if cache is None:
+            import weakref
+
+            # Keyed on the stream, not its fd: fds get reused.
+            cache = cls._cache = weakref.WeakKeyDictionary()
+        try:
+            return cache[file]
+        except KeyError:
+            pass
+        except TypeError:
+            # Cannot be weakly referenced, nothing to cache on.
+            return cls._probe(file)
 
-    if sys.platform in ['win32','win64','nt','windows']:
+        caps = cache[file] = cls._probe(file)
+        return caps
+
+    @classmethod
+    def _probe(cls, file):
         try:
-            import colorama
-            colorama.init()
+            fd = file.fileno()
+        except (AttributeError, ValueError, OSError):
+            # StringIO and friends.
+            fd = None
+        isatty = getattr(file, 'isatty', None)
+        return cls(fd, bool(isatty and isatty()))
+
+    @classmethod
+    def invalidate(cls, file=None):
+        """
+        Forgets the cached capabilities of file (a stream or an
+        fd), or of every stream.
+        """
+        cache = cls._cache
+        if cache is None:
+            return
+        if file is None:
+            cache.clear()
+        elif isinstance(file, int):
+            for stream, caps in list(cache.items()):
+                if caps.fd == file:
+                    cache.pop(stream, None)
+        else:
+            try:
+                cache.pop(file, None)
+            except TypeError:
+                pass
+
+    @classmethod
+    def watch_resize(cls):
+        """
+        Installs a SIGWINCH handler (chained to the one already
+        there) that probes the width of every cached terminal
+        again. Only works from the main thread, returns whether
+        the handler is installed.
+        """
+        import signal
+
+        if cls._resize_hooked:
             return True
-        except ImportError:
+        if not hasattr(signal, 'SIGWINCH'):
             return False
+        previous = signal.getsignal(signal.SIGWINCH)
 
-    if 'COLORTERM' in os.environ:
+        def on_resize(signum, frame):
+            for caps in list((cls._cache or {}).values()):
+                if caps.isatty:
+                    caps.width = caps._probe_width(caps.fd, caps.isatty)
+            if callable(previous):
+                previous(signum, frame)
+
+        try:
+            signal.signal(signal.SIGWINCH, on_resize)
+        except ValueError:
+            return False
+        cls._resize_hooked = True
         return True
 
-    term = os.environ.get('TERM', 'dumb').lower()
-    return term in ('xterm', 'linux') or 'color' in term
+    @staticmethod
+    def _probe_colors(isatty):
+        # Code from https://github.com/lepture/terminal/blob/master/terminal/color.py
+
+        if not isatty and 'TERMINAL-COLOR' not in os.environ:
+            return TerminalCapabilities.NONE
+
+        if sys.platform in ['win32','win64','nt','windows']:
+            try:
+                import colorama
+                colorama.init()
+                return TerminalCapabilities.COLOR_16
+            except ImportError:
+                return TerminalCapabilities.NONE
+
+        colorterm = os.environ.get('COLORTERM', '').lower()
+        term = os.environ.get('TERM', 'dumb').lower()
+        if colorterm in ('truecolor', '24bit'):
+            return TerminalCapabilities.TRUECOLOR
+        if '256' in term:
+            return TerminalCapabilities.COLOR_256
+        if 'COLORTERM' in os.environ or term in ('xterm', 'linux') or 'color' in term:
+            return TerminalCapabilities.COLOR_16
+        return TerminalCapabilities.NONE
+
+    @staticmethod
+    def _probe_width(fd, isatty):
+        if isatty:
+            try:
+                return os.get_terminal_size(fd).columns
+            except OSError:
+                pass
+        try:
+            return int(os.environ['COLUMNS'])
+        except (KeyError, ValueError):
+            return 80
+
+
+def is_color_supported(file=sys.stdout):
+    """
+    Returns true if color in supported by stdout/the given io stream
+    """
+    if not hasattr(file, 'isatty'):
+        return False
+    return TerminalCapabilities.get(file).colors >= TerminalCapabilities.COLOR_16
 
 
-def hex2ansi(code):
+@functools.lru_cache(maxsize=4096)
+def hex2ansi(code, nearest=False):
     """
     Convert hex code to ansi.
     """
@@ -75,51 +202,161 @@ def hex2ansi(code):
 
     if len(code) == 3:
         # efc -> eeffcc
-        return rgb2ansi(*map(lambda o: int(o * 2, 16), code))
+        code = code[0] * 2 + code[1] * 2 + code[2] * 2
 
     if len(code) != 6:
         raise ValueError('invalid color code')
 
-    rgb = (code[:2], code[2:4], code[4:])
-    return rgb2ansi(*map(lambda o: int(o, 16), rgb))
+    value = int(code, 16)
+    return rgb2ansi(value >> 16, (value >> 8) & 0xff, value & 0xff, nearest=nearest)
 
 
 def is_256color_supported(file=sys.stdout):
     """
     Returns true if stdout/the given io stream supports ansi 256 color.
     """
+    if not hasattr(file, 'isatty'):
+        return False
+    return TerminalCapabilities.get(file).colors >= TerminalCapabilities.COLOR_256
 
-    # Code from https://github.com/lepture/terminal/blob/master/terminal/color.py
 
-    if not is_color_supported(file=file):
-        return False
-    term = os.environ.get('TERM', 'dumb').lower()
-    return '256' in term
+_CUBE_LEVELS = (0, 95, 135, 175, 215, 255)
 
+# The real xterm palette: 16 system colors, the 6x6x6 cube and 24 grays.
+XTERM_PALETTE = (
+    (0, 0, 0), (205, 0, 0), (0, 205, 0), (205, 205, 0),
+    (0, 0, 238), (205, 0, 205), (0, 205, 205), (229, 229, 229),
+    (127, 127, 127), (255, 0, 0), (0, 255, 0), (255, 255, 0),
+    (92, 92, 255), (255, 0, 255), (0, 255, 255), (255, 255, 255),
+) + tuple(
+    (r, g, b) for r in _CUBE_LEVELS for g in _CUBE_LEVELS for b in _CUBE_LEVELS
+) + tuple(
+    (8 + 10 * i,) * 3 for i in range(24)
+)
 
-def rgb2ansi(r, g, b):
+# Lookup tables for rgb2ansi(), indexed by a 0-255 channel value
+# (or by r + g + b for the gray ones).
+_RGB_BAND = tuple(int((v + 40) // 42.5) for v in range(256))
+_RGB_CUBE = tuple(int(6 * v / 256) for v in range(256))
+_RGB_GRAY = tuple(232 + s // 33 for s in range(766))
+_NEAREST_LEVEL = tuple(min(range(6), key=lambda i: abs(_CUBE_LEVELS[i] - v)) for v in range(256))
+_NEAREST_GRAY = tuple(min(max(int(round((s / 3 - 8) / 10)), 0), 23) for s in range(766))
+
+
+def rgb2ansi(r, g, b, nearest=False):
     """
     Converts an RGB color to 256 ansi graphics.
+
+    By default the color is quantised the same way as
+    https://github.com/tehmaze/ansi does, with nearest=True
+    the closest color of the real xterm palette is used.
+    """
+    r, g, b = int(r), int(g), int(b)
+
+    if nearest:
+        return _nearest_ansi(r, g, b)
+
+    band = _RGB_BAND[r]
+    if band == _RGB_BAND[g] == _RGB_BAND[b]:
+        return _RGB_GRAY[r + g + b]
+    return 16 + 36 * _RGB_CUBE[r] + 6 * _RGB_CUBE[g] + _RGB_CUBE[b]
+
+
+def _nearest_ansi(r, g, b):
+    """
+    Returns the index of the xterm cube or gray color closest to r, g, b.
+    """
+    # The cube is a grid, so its closest color is found per channel, and
+    # the closest gray is the one nearest to the mean of the channels.
+    ri, gi, bi = _NEAREST_LEVEL[r], _NEAREST_LEVEL[g], _NEAREST_LEVEL[b]
+    cr, cg, cb = _CUBE_LEVELS[ri], _CUBE_LEVELS[gi], _CUBE_LEVELS[bi]
+    gray = _NEAREST_GRAY[r + g + b]
+    level = 8 + 10 * gray
+
+    cube_distance = (r - cr) ** 2 + (g - cg) ** 2 + (b - cb) ** 2
+    gray_distance = (r - level) ** 2 + (g - level) ** 2 + (b - level) ** 2
+    if gray_distance < cube_distance:
+        return 232 + gray
+    return 16 + 36 * ri + 6 * gi + bi
+
+
+def rgb2ansi_many(colors, nearest=False):
+    """
+    Converts a sequence of RGB tuples to 256 ansi graphics in one go.
+
+    If colors is a NumPy array of shape (..., 3) the conversion is
+    vectorized and an array of indices is returned, otherwise a list.
     """
+    if type(colors).__module__ == 'numpy':
+        return _rgb2ansi_numpy(colors, nearest)
+
+    if nearest:
+        return [_nearest_ansi(int(r), int(g), int(b)) for r, g, b in colors]
+
+    band, cube, gray = _RGB_BAND, _RGB_CUBE, _RGB_GRAY
+    out = []
+    append = out.append
+    for r, g, b in colors:
+        r, g, b = int(r), int(g), int(b)
+        if band[r] == band[g] == band[b]:
+            append(gray[r + g + b])
+        else:
+            append(16 + 36 * cube[r] + 6 * cube[g] + cube[b])
+    return out
+
+
+def _rgb2ansi_numpy(colors, nearest):
+    import numpy
+
+    colors = numpy.asarray(colors).astype(numpy.intp)
+    r, g, b = colors[..., 0], colors[..., 1], colors[..., 2]
+    total = r + g + b
+
+    if nearest:
+        levels = numpy.array(_CUBE_LEVELS)
+        index = numpy.array(_NEAREST_LEVEL)
+        ri, gi, bi = index[r], index[g], index[b]
+        cube_distance = (r - levels[ri]) ** 2 + (g - levels[gi]) ** 2 + (b - levels[bi]) ** 2
+        gray = numpy.array(_NEAREST_GRAY)[total]
+        level = 8 + 10 * gray
+        gray_distance = (r - level) ** 2 + (g - level) ** 2 + (b - level) ** 2
+        return numpy.where(gray_distance < cube_distance, 232 + gray, 16 + 36 * ri + 6 * gi + bi)
 
-    # Code from https://github.com/tehmaze/ansi/blob/master/ansi/colour/rgb.py
+    band = numpy.array(_RGB_BAND)
+    cube = numpy.array(_RGB_CUBE)
+    is_gray = (band[r] == band[g]) & (band[g] == band[b])
+    return numpy.where(is_gray, numpy.array(_RGB_GRAY)[total], 16 + 36 * cube[r] + 6 * cube[g] + cube[b])
 
-    grayscale = False
-    poss = True
-    step = 2.5
 
-    while poss:
-        if min(r, g, b) < step:
-            grayscale = max(r, g, b) < step
-            poss = False
+def rgb2sgr(r, g, b, background=False, colors=None):
+    """
+    Returns the escape sequence that sets the given RGB color
+    as well as the terminal can show it.
+
+    Truecolor terminals get the color passed through as is,
+    others get the nearest 256 or 16 color. The color depth
+    defaults to the one of stdout (see TerminalCapabilities).
+    """
+    if colors is None:
+        colors = TerminalCapabilities.get(sys.stdout).colors
 
-        step += 42.5
+    if colors >= TerminalCapabilities.TRUECOLOR:
+        return f'\33[{48 if background else 38};2;{int(r)};{int(g)};{int(b)}m'
+    if colors >= TerminalCapabilities.COLOR_256:
+        return f'\33[{48 if background else 38};5;{_nearest_ansi(int(r), int(g), int(b))}m'
+    if colors >= TerminalCapabilities.COLOR_16:
+        index = _nearest_system_color(int(r), int(g), int(b))
+        if index < 8:
+            return f'\33[{(40 if background else 30) + index}m'
+        return f'\33[{(100 if background else 90) + index - 8}m'
+    return ''
 
-    if grayscale:
-        return 232 + int(float(sum((r, g, b)) / 33.0))
 
-    m = ((r, 36), (g, 6), (b, 1))
-    return 16 + sum(int(6 * float(val) / 256) * mod for val, mod in m)
+@functools.lru_cache(maxsize=4096)
+def _nearest_system_color(r, g, b):
+    return min(range(16), key=lambda i: (
+        (XTERM_PALETTE[i][0] - r) ** 2 + (XTERM_PALETTE[i][1] - g) ** 2 + (XTERM_PALETTE[i][2] - b) ** 2
+    ))
 
 
 def quit(message=''):
@@ -192,31 +429,185 @@ def platform():
         return "Unknown"
 
 
-def safe_quit(message=''):
+def _process_table():
+    """
+    Reads /proc/*/stat once, returns {pid: (ppid, pgid, state)}.
+    """
+    table = {}
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat', 'rb') as file:
+                data = file.read()
+        except OSError:
+            # Exited while we were looking.
+            continue
+        # The command name can hold spaces and parentheses itself.
+        fields = data[data.rindex(b')') + 2:].split(None, 3)
+        table[int(name)] = (int(fields[1]), int(fields[2]), fields[0])
+    return table
+
+
+def _running(pid):
+    try:
+        with open(f'/proc/{pid}/stat', 'rb') as file:
+            data = file.read()
+    except OSError:
+        return False
+    end = data.rindex(b')')
+    return data[end + 2:end + 3] != b'Z'
+
+
+def process_tree(pid=None, groups=False):
+    """
+    Returns the pids of every descendant of pid (this process by
+    default), parents before their children. With groups=True the
+    other members of their process groups are included too, which
+    catches processes that left the tree by daemonizing.
+    """
+    if pid is None:
+        pid = os.getpid()
+    table = _process_table()
+    children = {}
+    for child, (parent, _, _) in table.items():
+        children.setdefault(parent, []).append(child)
+
+    tree = []
+    todo = deque(children.get(pid, ()))
+    while todo:
+        child = todo.popleft()
+        tree.append(child)
+        todo.extend(children.get(child, ()))
+
+    if groups:
+        pgids = {table[child][1] for child in tree}
+        if pid in table:
+            pgids.discard(table[pid][1])
+        found = set(tree)
+        found.add(pid)
+        tree.extend(other for other, (_, pgid, _) in table.items() if pgid in pgids and other not in found)
+    return tree
+
+
+def _signal_pids(pids, handles, signum):
+    """
+    Sends signum to pids, through their pidfd if there is one.
+    Returns the ones it was not allowed to signal.
+    """
+    import signal
+
+    denied = []
+    for pid in pids:
+        try:
+            if pid in handles:
+                signal.pidfd_send_signal(handles[pid], signum)
+            else:
+                os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+        except PermissionError:
+            denied.append(pid)
+    return denied
+
+
+def _wait_pids(pids, handles, timeout):
+    """
+    Waits at most timeout seconds for pids to exit, returns the
+    ones still running. A pidfd turns readable when its process
+    exits, the others are polled through /proc.
+    """
+    import selectors
+
+    deadline = time.monotonic() + timeout
+    pending = set(pids)
+    delay = 0.001
+    with selectors.DefaultSelector() as selector:
+        for pid in pending:
+            if pid in handles:
+                selector.register(handles[pid], selectors.EVENT_READ, pid)
+        while pending:
+            polled = [pid for pid in pending if pid not in handles]
+            for pid in polled:
+                if not _running(pid):
+                    pending.discard(pid)
+            remaining = deadline - time.monotonic()
+            if not pending or remaining <= 0:
+                break
+            for key, _ in selector.select(min(delay, remaining) if polled else remaining):
+                pending.discard(key.data)
+                selector.unregister(key.fileobj)
+            delay = min(delay * 2, 0.05)
+    return [pid for pid in pids if pid in pending]
+
+
+def reap(pid=None, timeout=1.0, groups=False, pidfd=True):
+    """
+    Stops every descendant of pid (this process by default):
+    SIGTERM goes to the whole tree at once, whatever is still
+    running after timeout seconds gets SIGKILL.
+
+    Returns a dict with the pids that exited after SIGTERM
+    ('terminated'), those that needed SIGKILL ('killed'), those
+    that could not be stopped ('survivors') and how long it took
+    ('elapsed').
+
+     groups - Also stop the rest of their process groups
+     pidfd - Hold the processes by pidfd (where the system has
+             them), so a reused pid is never signalled
+    """
+    import signal
+
+    begin = time.monotonic()
+    try:
+        tree = process_tree(pid, groups)
+    except FileNotFoundError:
+        # No /proc (macOS, the BSDs), nothing to reap.
+        tree = []
+    handles = {}
+    if pidfd and hasattr(os, 'pidfd_open'):
+        for child in tree:
+            try:
+                handles[child] = os.pidfd_open(child)
+            except OSError:
+                # Gone already, or no pidfd support.
+                pass
+
+    try:
+        survivors = _signal_pids(tree, handles, signal.SIGTERM)
+        running = _wait_pids([child for child in tree if child not in survivors], handles, timeout)
+        denied = _signal_pids(running, handles, signal.SIGKILL)
+        survivors += denied
+        remaining = _wait_pids([child for child in running if child not in denied], handles, timeout)
+        survivors += remaining
+    finally:
+        for handle in handles.values():
+            os.close(handle)
+
+    return {
+        'terminated': [child for child in tree if child not in running and child not in survivors],
+        'killed': [child for child in running if child not in survivors],
+        'survivors': survivors,
+        'elapsed': time.monotonic() - begin
+    }
+
+
+def safe_quit(message='', timeout=1.0):
     """
     Quits the program by killing the current
     running process.
     
-    It will also kill any child processes/threads.
+    It will also kill any child processes (and their
+    children), see reap().
     """
+    import signal
+
     if message:
         sys.stderr.write(message)
         sys.stderr.flush()
 
-    childpidlist = []
-    try:
-        out = str(subprocess.check_output(['sudo','ps','--ppid',str(os.getpid())],stdin=subprocess.PIPE,stderr=subprocess.PIPE))
-    except FileNotFoundError:
-        out = str(subprocess.check_output(['ps','--ppid',str(os.getpid())],stdin=subprocess.PIPE,stderr=subprocess.PIPE))
-    out = '\n'.split(out)
-    out.pop(0)
-    for cpidinfo in out:
-        childpidlist.append(int(cpidinfo.split('/')[1].split(' ')[0]))
-
-    for cpid in childpidlist:
-        os.kill(cpid, 9)
-
-    os.kill(os.getpid(), 9)
+    reap(timeout=timeout)
+    os.kill(os.getpid(), signal.SIGKILL)
 
 
 def print_error(error):
@@ -234,49 +625,267 @@ def get_fp_from_fd(fd):
     return os.readlink(f"/proc/{os.getpid()}/fd/{fd.fileno()}")
 
 
-def getch():
+# Escape sequences KeyReader decodes, by the name of the key.
+_KEY_SEQUENCES = {
+    'arrow_up': ('\x1b[A', '\x1bOA'),
+    'arrow_down': ('\x1b[B', '\x1bOB'),
+    'arrow_right': ('\x1b[C', '\x1bOC'),
+    'arrow_left': ('\x1b[D', '\x1bOD'),
+    'home': ('\x1b[H', '\x1bOH', '\x1b[1~', '\x1b[7~'),
+    'end': ('\x1b[F', '\x1bOF', '\x1b[4~', '\x1b[8~'),
+    'insert': ('\x1b[2~',),
+    'delete': ('\x1b[3~',),
+    'page_up': ('\x1b[5~',),
+    'page_down': ('\x1b[6~',),
+    'shift_tab': ('\x1b[Z',),
+    'f1': ('\x1bOP', '\x1b[11~'),
+    'f2': ('\x1bOQ', '\x1b[12~'),
+    'f3': ('\x1bOR', '\x1b[13~'),
+    'f4': ('\x1bOS', '\x1b[14~'),
+    'f5': ('\x1b[15~',),
+    'f6': ('\x1b[17~',),
+    'f7': ('\x1b[18~',),
+    'f8': ('\x1b[19~',),
+    'f9': ('\x1b[20~',),
+    'f10': ('\x1b[21~',),
+    'f11': ('\x1b[23~',),
+    'f12': ('\x1b[24~',),
+    'paste': ('\x1b[200~',),
+}
+
+# Single bytes reported by name.
+_KEY_CODES = {
+    127: 'backspace',
+    8: 'backspace',
+    32: 'space',
+    9: 'tab',
+    27: 'esc',
+    13: 'enter',
+    10: 'enter',
+    20: 'caps_lock',
+    17: 'ctrl',
+    16: 'shift'
+}
+
+_PASTE_END = b'\x1b[201~'
+
+
+@functools.lru_cache(maxsize=None)
+def _key_trie():
     """
-    Returns keycode when a key is pressed.
+    Builds a trie of _KEY_SEQUENCES: nested dicts by byte,
+    ending in the name of the key.
     """
-    fd = sys.stdin.fileno()
-    
-    old_settings = termios.tcgetattr(fd)
-    try:
-        tty.setraw(sys.stdin.fileno())
-        ch = sys.stdin.read(1)
-    finally:
-        termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
+    trie = {}
+    for name, sequences in _KEY_SEQUENCES.items():
+        for sequence in sequences:
+            node = trie
+            data = sequence.encode('ascii')
+            for byte in data[:-1]:
+                node = node.setdefault(byte, {})
+            node[data[-1]] = name
+    return trie
+
+
+class Paste(str):
+    """
+    Text pasted into a KeyReader with paste=True.
+    """
+    __slots__ = ()
+
+
+class KeyReader(object):
+    """
+    Reads keys from a terminal, putting it in raw mode once for
+    as long as the reader is open:
+
+        with KeyReader() as keys:
+            key = keys.read(timeout=0.5)
+
+    Keys come back as the character typed or, for special keys,
+    their name ('arrow_up', 'f5', 'page_down', 'enter', ...).
+    Escape sequences the reader does not know come back as they
+    are.
+
+     file - The terminal (stdin by default)
+     paste - Turn on bracketed paste, pasted text then comes
+             back in one piece as a Paste instead of key by key
+     esc_timeout - How long to wait for the rest of an escape
+                   sequence before reporting a lone 'esc'
+    """
+    def __init__(self, file=None, paste=False, esc_timeout=0.05):
+        self.file = sys.stdin if file is None else file
+        self.paste = paste
+        self.esc_timeout = esc_timeout
+        self._fd = None
+        self._old = None
+        self._selector = None
+        self._buffer = bytearray()
+        self._read_size = 4096
+        self._eof = False
 
-    return ord(ch)
+    def __enter__(self):
+        import selectors
+        import termios
+        import tty
 
+        self._fd = self.file if isinstance(self.file, int) else self.file.fileno()
+        try:
+            self._old = termios.tcgetattr(self._fd)
+        except termios.error:
+            # Not a terminal (a pipe), read it as it is.
+            self._old = None
+        else:
+            # TCSANOW, the default TCSAFLUSH throws typed ahead input away.
+            tty.setraw(self._fd, termios.TCSANOW)
+            if self.paste:
+                os.write(self._fd, b'\x1b[?2004h')
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._fd, selectors.EVENT_READ)
+        return self
 
-def getchar():
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __iter__(self):
+        while True:
+            try:
+                yield self.read()
+            except EOFError:
+                return
+
+    def close(self):
+        if self._selector is None:
+            return
+        self._selector.close()
+        self._selector = None
+        if self._old is not None:
+            import termios
+
+            if self.paste:
+                os.write(self._fd, b'\x1b[?2004l')
+            termios.tcsetattr(self._fd, termios.TCSADRAIN, self._old)
+            self._old = None
+
+    def _fill(self, timeout):
+        """
+        Waits at most timeout seconds for input and reads all that
+        is there. Returns False if nothing came.
+        """
+        if not self._selector.select(timeout):
+            return False
+        data = os.read(self._fd, self._read_size)
+        if not data:
+            if not self._buffer or self._eof:
+                raise EOFError("End of input!")
+            self._eof = True
+            return False
+        self._buffer += data
+        return True
+
+    def _decode(self, final):
+        """
+        Decodes the key at the start of the buffer. Returns the key
+        and how many bytes it took, or 0 if it is not all there
+        yet (unless final, then it takes what there is).
+        """
+        buffer = self._buffer
+        first = buffer[0]
+        if first != 27:
+            if first < 128:
+                return _KEY_CODES.get(first, chr(first)), 1
+            size = 4 if first >= 0xf0 else 3 if first >= 0xe0 else 2 if first >= 0xc0 else 1
+            if len(buffer) < size:
+                if not final:
+                    return None, 0
+                size = len(buffer)
+            return buffer[:size].decode('utf-8', 'replace'), size
+
+        node = _key_trie()
+        for index in range(len(buffer)):
+            node = node.get(buffer[index])
+            if node is None:
+                break
+            if type(node) is str:
+                if node != 'paste':
+                    return node, index + 1
+                end = buffer.find(_PASTE_END, index + 1)
+                if end < 0:
+                    # A paste waits for its end, however long.
+                    if not (final and self._eof):
+                        return None, 0
+                    return Paste(buffer[index + 1:].decode('utf-8', 'replace')), len(buffer)
+                return Paste(buffer[index + 1:end].decode('utf-8', 'replace')), end + len(_PASTE_END)
+        else:
+            if len(buffer) == 1 or not final:
+                return ('esc', 1) if final else (None, 0)
+
+        # Not a known sequence, pass CSI and SS3 ones on whole.
+        if len(buffer) > 2 and buffer[1] == 79:
+            return buffer[:3].decode('latin-1'), 3
+        if buffer[1] == 91:
+            for index in range(2, len(buffer)):
+                if 64 <= buffer[index] <= 126:
+                    return buffer[:index + 1].decode('latin-1'), index + 1
+            if not final:
+                return None, 0
+        return 'esc', 1
+
+    def read(self, timeout=None):
+        """
+        Returns the next key, or None if none came within timeout
+        seconds (None waits forever, 0 only polls).
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self._buffer:
+                key, size = self._decode(False)
+                if not size:
+                    # Give the rest of a sequence a moment to arrive.
+                    if self._fill(self.esc_timeout):
+                        continue
+                    key, size = self._decode(True)
+                if size:
+                    del self._buffer[:size]
+                    return key
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            if not self._fill(remaining) and deadline is not None:
+                return None
+
+    def poll(self):
+        """
+        Returns a key if one was pressed, None otherwise.
+        """
+        return self.read(0)
+
+
+def getch():
     """
-    Returns key when one is pressed.
-    """
-    keycode = getch()
-
-    special = {
-        127: 'backspace',
-        32: 'space',
-        9: 'tab',
-        27: 'esc',
-        65: 'arrow_up',
-        66: 'arrow_down',
-        67: 'arrow_right',
-        68: 'arrow_left',
-        13: 'enter',
-        20: 'caps_lock',
-        17: 'ctrl',
-        16: 'shift'
-    }
+    Returns keycode when a key is pressed.
+    """
+    with KeyReader() as reader:
+        # Only take one character off the terminal, the rest of
+        # an escape sequence stays there for the next call.
+        reader._read_size = 1
+        reader._fill(None)
+        while True:
+            try:
+                return ord(reader._buffer.decode('utf-8'))
+            except UnicodeDecodeError:
+                if len(reader._buffer) >= 4:
+                    return ord(reader._buffer.decode('utf-8', 'replace')[0])
+                reader._fill(None)
 
-    if keycode in special.keys():
-        ch = special[keycode]
-    else:
-        ch = chr(keycode)
 
-    return ch
+def getchar():
+    """
+    Returns key when one is pressed, see KeyReader for the names
+    of the special keys. Use a KeyReader to read more than one.
+    """
+    with KeyReader() as reader:
+        # Read no further than the key, typing ahead is kept.
+        reader._read_size = 1
+        return reader.read()
 
 
 def getpass(prompt: str = "Password: ", mask: str = ''):
@@ -287,74 +896,123 @@ def getpass(prompt: str = "Password: ", mask: str = ''):
         raise ValueError("Mask can only be 1 digit long!")
 
     if mask == '' or sys.stdin != sys.__stdin__:
+        import getpass
+
         return getpass.getpass(prompt)
     else:
         enteredpassword = []
         sys.stdout.write(prompt)
         sys.stdout.flush()
-        while 1:
-            key = ord(getch())
-            if key == 13:
-                sys.stdout.write('\n')
-                return ''.join(enteredpassword)
-            elif key in [8, 127]:
-                if len(enteredpassword) > 0:
-                    sys.stdout.write('\b \b')
+        with KeyReader(paste=True) as reader:
+            for key in reader:
+                # A paste is text, even if it reads "enter".
+                if isinstance(key, Paste) or key == 'space' or (len(key) == 1 and key.isprintable()):
+                    text = ' ' if key == 'space' and not isinstance(key, Paste) else key
+                    sys.stdout.write(mask * len(text))
                     sys.stdout.flush()
-                    enteredpassword = enteredpassword[:-1]
-                elif 0 <= key <= 31:
-                    continue
-                else:
-                    char = chr(key)
-                    sys.stdout.write(mask)
+                    enteredpassword.extend(text)
+                elif key == 'enter':
+                    sys.stdout.write('\r\n')
                     sys.stdout.flush()
-                    enteredpassword.append(char)
-
-
-class Foreground(Enum):
-    RED = '\33[31m'
-    BRIGHT_RED = '\33[91m'
-    GREEN = '\33[32m'
-    BRIGHT_GREEN = '\33[92m'
-    YELLOW = '\33[33m'
-    BRIGHT_YELLOW = '\33[93m'
-    BLUE = '\33[34m'
-    BRIGHT_BLUE = '\33[94m'
-    PURPLE = '\33[35m'
-    BRIGHT_PURPLE = '\33[95m'
-    VIOLET = '\33[35m'
-    BRIGHT_VOILET = '\33[95m'
-    CYAN = '\x1b[6;30;36m'
-    BRIGHT_CYAN = '\x1b[6;30;96m'
-    BLACK = '\33[30m'
-    GRAY = '\33[90m'
-    GREY = '\33[90m'
-    WHITE = '\33[97m'
-    RESET = '\033[0m'
-    CLEAR = RESET
+                    return ''.join(enteredpassword)
+                elif key == 'backspace':
+                    if len(enteredpassword) > 0:
+                        sys.stdout.write('\b \b')
+                        sys.stdout.flush()
+                        enteredpassword.pop()
+        sys.stdout.write('\r\n')
+        return ''.join(enteredpassword)
 
 
-class Background(Enum):
-    RED = '\33[41m'
-    BRIGHT_RED = '\33[101m'
-    GREEN = '\33[42m'
-    BRIGHT_GREEN = '\33[102m'
-    YELLOW = '\33[43m'
-    BRIGHT_YELLOW = '\33[103m'
-    BLUE = '\33[44m'
-    BRIGHT_BLUE = '\33[104m'
-    PURPLE = '\33[45m'
-    BRIGHT_PURPLE = '\33[105m'
-    VIOLET = '\33[45m'
-    BRIGHT_VOILET = '\33[105m'
-    CYAN = '\x1b[6;30;46m'
-    BRIGHT_CYAN = '\x1b[6;30;106m'
-    BLACK = '\33[40m'
-    GRAY = '\33[100m'
-    GREY = '\33[100m'
-    WHITE = '\33[47m'
-    RESET = '\033[0m'
-    CLEAR = RESET
+def _color_enums():
+    """
+    Builds Foreground and Background, see __getattr__().
+    """
+    from enum import Enum
+
+    class Foreground(Enum):
+        RED = '\33[31m'
+        BRIGHT_RED = '\33[91m'
+        GREEN = '\33[32m'
+        BRIGHT_GREEN = '\33[92m'
+        YELLOW = '\33[33m'
+        BRIGHT_YELLOW = '\33[93m'
+        BLUE = '\33[34m'
+        BRIGHT_BLUE = '\33[94m'
+        PURPLE = '\33[35m'
+        BRIGHT_PURPLE = '\33[95m'
+        VIOLET = '\33[35m'
+        BRIGHT_VOILET = '\33[95m'
+        CYAN = '\x1b[6;30;36m'
+        BRIGHT_CYAN = '\x1b[6;30;96m'
+        BLACK = '\33[30m'
+        GRAY = '\33[90m'
+        GREY = '\33[90m'
+        WHITE = '\33[97m'
+        RESET = '\033[0m'
+        CLEAR = RESET
+
+
+    class Background(Enum):
+        RED = '\33[41m'
+        BRIGHT_RED = '\33[101m'
+        GREEN = '\33[42m'
+        BRIGHT_GREEN = '\33[102m'
+        YELLOW = '\33[43m'
+        BRIGHT_YELLOW = '\33[103m'
+        BLUE = '\33[44m'
+        BRIGHT_BLUE = '\33[104m'
+        PURPLE = '\33[45m'
+        BRIGHT_PURPLE = '\33[105m'
+        VIOLET = '\33[45m'
+        BRIGHT_VOILET = '\33[105m'
+        CYAN = '\x1b[6;30;46m'
+        BRIGHT_CYAN = '\x1b[6;30;106m'
+        BLACK = '\33[40m'
+        GRAY = '\33[100m'
+        GREY = '\33[100m'
+        WHITE = '\33[47m'
+        RESET = '\033[0m'
+        CLEAR = RESET
+
+    Foreground.__qualname__ = 'Foreground'
+    Background.__qualname__ = 'Background'
+    return Foreground, Background
+
+
+_LAZY_MODULES = ('subprocess', 'termios', 'tty', 'pickle', 'fnmatch', 'random', 'enum')
+
+
+def __getattr__(name):
+    """
+    Imports the modules and builds the Enum classes that
+    are not needed at import time the first time they
+    are asked for (PEP 562).
+    """
+    if name in ('Foreground', 'Background'):
+        globals()['Foreground'], globals()['Background'] = _color_enums()
+        return globals()[name]
+    if name == 'Enum':
+        from enum import Enum
+        globals()['Enum'] = Enum
+        return Enum
+    if name in _LAZY_MODULES:
+        module = __import__(name)
+        globals()[name] = module
+        return module
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | {'Foreground', 'Background', 'Enum'})
+
+
+if sys.version_info < (3, 7):
+    # There is no module __getattr__ before Python 3.7, so
+    # everything it would load is loaded now.
+    for _name in ('Foreground', 'Background', 'Enum') + _LAZY_MODULES:
+        __getattr__(_name)
+    del _name
 
 
 class Effects():
@@ -387,27 +1045,298 @@ def clearlines(lines=1):
     """
     Clears the amount of lines specified.
     """
-    for _ in range(lines):
-        sys.stdout.write('\x1b[1A')
-        sys.stdout.write('\x1b[2K')
-        sys.stdout.flush()
+    sys.stdout.write('\x1b[1A\x1b[2K' * lines)
+    sys.stdout.flush()
 
 
 def clearline():
-    sys.stdout.write('\x1b[1A')
-    sys.stdout.write('\x1b[2K')
-    sys.stdout.flush()
+    clearlines(1)
 
 
-def fancyprint(*args, sep: str = ' ', start: str = '', end: str = '\n', fore: str = '', back: str = '', color: str = '\33[0m', case: str = 'normal', file=sys.stdout, **kwargs):
+class Screen(object):
     """
-    An very improved version of print().
-    
-    Works the same, but you can change the case, color, and more.
+    A virtual screen that only sends the terminal what changed.
+
+    Draw into it with put() (or clear()), then refresh() compares
+    it with what is on the terminal and writes, in one go, just
+    the cursor moves, styles and characters of the cells that
+    differ:
+
+        with Screen() as screen:
+            screen.put(0, 0, 'Hello', Foreground.RED.value)
+            screen.refresh()
+
+    A style is the escape sequence that sets it ('' for none),
+    e.g. a Foreground or Background value or rgb2sgr(). As a
+    context manager it switches to the alternate screen and
+    hides the cursor.
+
+     width, height - The size, the terminal's by default
+     file - Where to draw
+    """
+    def __init__(self, width=None, height=None, file=sys.stdout):
+        self.file = file
+        if width is None or height is None:
+            try:
+                size = os.get_terminal_size(file.fileno())
+            except (AttributeError, ValueError, OSError):
+                size = os.terminal_size((80, 24))
+            width = size.columns if width is None else width
+            height = size.lines if height is None else height
+        self.width = 0
+        self.height = 0
+        self.resize(width, height)
+
+    def __repr__(self):
+        return f'<Screen {self.width}x{self.height}>'
+
+    def __enter__(self):
+        self.file.write('\33[?1049h\33[?25l')
+        self.invalidate()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.file.write('\33[0m\33[?25h\33[?1049l')
+        self.file.flush()
+
+    def resize(self, width, height):
+        """
+        Changes the size, keeping what fits, and redraws it all on
+        the next refresh().
+        """
+        chars = [' '] * (width * height)
+        styles = [''] * (width * height)
+        for y in range(min(height, self.height)):
+            old = y * self.width
+            new = y * width
+            keep = min(width, self.width)
+            chars[new:new + keep] = self._chars[old:old + keep]
+            styles[new:new + keep] = self._styles[old:old + keep]
+        self.width = width
+        self.height = height
+        self._chars = chars
+        self._styles = styles
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        Forgets what is on the terminal, so the next refresh()
+        redraws everything.
+        """
+        self._front_chars = None
+        self._front_styles = None
+
+    def clear(self, style=''):
+        size = self.width * self.height
+        self._chars[:] = [' '] * size
+        self._styles[:] = [style] * size
+
+    def put(self, x, y, text, style=''):
+        """
+        Writes a line of text at column x, row y (from 0), cutting
+        off whatever does not fit.
+        """
+        if not 0 <= y < self.height or x >= self.width:
+            return
+        if x < 0:
+            text = text[-x:]
+            x = 0
+        text = text[:self.width - x]
+        start = y * self.width + x
+        self._chars[start:start + len(text)] = text
+        self._styles[start:start + len(text)] = [style] * len(text)
+
+    def get(self, x, y):
+        """
+        Returns the (character, style) at column x, row y.
+        """
+        index = y * self.width + x
+        return self._chars[index], self._styles[index]
+
+    def render(self, full=False):
+        """
+        Returns what refresh() would write, without writing it.
+        """
+        width = self.width
+        chars = self._chars
+        styles = self._styles
+        front_chars = self._front_chars
+        front_styles = self._front_styles
+        full = full or front_chars is None
+
+        out = []
+        style = ''
+        # The cursor, cy is -1 while its place is not known.
+        cx = cy = -1
+        for y in range(self.height):
+            start = y * width
+            end = start + width
+            if not full and chars[start:end] == front_chars[start:end] and styles[start:end] == front_styles[start:end]:
+                continue
+            for index in range(start, end):
+                char = chars[index]
+                cell = styles[index]
+                if not full and char == front_chars[index] and cell == front_styles[index]:
+                    continue
+                x = index - start
+                if cy != y or cx != x:
+                    gap = x - cx
+                    if cy == y and 0 < gap < 4 and styles[index - gap:index] == [style] * gap:
+                        # Printing the unchanged cells again is shorter.
+                        out.append(''.join(chars[index - gap:index]))
+                    elif cy == y and gap > 0:
+                        out.append(f'\33[{gap}C')
+                    else:
+                        out.append(f'\33[{y + 1};{x + 1}H')
+                if cell != style:
+                    out.append('\33[0m' + cell if style else cell)
+                    style = cell
+                out.append(char)
+                cx, cy = x + 1, y
+                if cx == width:
+                    cy = -1
+        if style:
+            out.append('\33[0m')
+        return ''.join(out)
+
+    def refresh(self, full=False):
+        """
+        Puts the changes on the terminal (everything with full) in a
+        single write. Returns how many characters that took.
+        """
+        data = self.render(full)
+        self._front_chars = self._chars[:]
+        self._front_styles = self._styles[:]
+        if data:
+            self.file.write(data)
+            self.file.flush()
+        return len(data)
+
+
+_PUNCTUATION_TABLE = str.maketrans('', '', ',-\'"<>_!?$%@^&*`~\\/{}[]:;+=')
+_LEET_TABLE = str.maketrans('eEiIsSzZaAbBoO', '33115522448800')
+
+
+def _resep(text, sep):
+    """
+    Swaps the single spaces between words for sep.
+    """
+    if sep == ' ':
+        return text
+    return sep.join(text.split(' '))
+
+
+def _case_normal(text, sep):
+    return _resep(text, sep)
+
+
+def _case_upper(text, sep):
+    return _resep(text.upper(), sep)
+
+
+def _case_lower(text, sep):
+    return _resep(text.lower(), sep)
+
+
+def _case_leet(text, sep):
+    return _resep(text.translate(_LEET_TABLE), sep)
+
+
+def _case_sticky(text, sep):
+    return _resep(text.swapcase(), sep)
+
+
+def _case_random(text, sep):
+    import random
+
+    choice = random.choice
+    return _resep(''.join([choice((char.upper(), char.lower())) for char in text]), sep)
+
+
+def _case_sentence(text, sep):
+    return _resep(text[:1].upper() + text[1:], sep)
+
+
+def _case_camel(text, sep):
+    first, _, rest = text.partition(' ')
+    words = rest.translate(_PUNCTUATION_TABLE).split(' ') if rest else []
+    return first[:1].lower() + first[1:] + ''.join([word[:1].upper() + word[1:] for word in words])
+
+
+def _case_pascal(text, sep):
+    return ''.join([word[:1].upper() + word[1:] for word in text.split(' ')])
+
+
+def _case_train(text, sep):
+    first, _, rest = text.partition(' ')
+    first = first[:1].upper() + first[1:]
+    if not rest:
+        return first
+    return first + '-' + rest.lower().replace(' ', '-')
+
+
+def _case_snake(text, sep):
+    return text.lower().replace(' ', '_')
+
+
+def _case_flat(text, sep):
+    return text.lower().replace(' ', '')
+
+
+def _case_kebab(text, sep):
+    return text.lower().replace(' ', '-')
+
+
+def _case_macro(text, sep):
+    return text.upper().replace(' ', '_')
+
+
+def _case_cobol(text, sep):
+    return text.upper().replace(' ', '-')
+
+
+_CASES = {}
+
+for _aliases, _transform in (
+    (['normal'], _case_normal),
+    (['camel','camelcase','lowercamel','lowercamelcase','camel-case','lowercamel-case','lower-camelcase','lower-camel-case','lower-camel'], _case_camel),
+    (['train','traincase','train-case'], _case_train),
+    (['sentence','sentencecase','sentence-case'], _case_sentence),
+    (['leet','leetcase','leet-case'], _case_leet),
+    (['pascal','pascalcase','pascal-case','capitalcamel','capital-camel','capitalcamel-case','capital-camelcase','capital-camel-case','capitalcamelcase'], _case_pascal),
+    (['snake','snakecase','snake-case','snake_case','c','ccase','c-case','c_case'], _case_snake),
+    (['flat','flatcase','flat-case'], _case_flat),
+    (['spinal','spinalcase','spinal-case','hyphen','hyphencase','hyphen-case','dash','dashcase','dash-case'], _case_kebab),
+    (['macro','macrocase','macro-case'], _case_macro),
+    (['cobol','cobolcase','cobol-case'], _case_cobol),
+    (['kebab','kebabcase','kebab-case','lisp','lispcase','lisp-case','css','csscase','css-case'], _case_kebab),
+    (['upper','uppercase','upper-case'], _case_upper),
+    (['lower','lowercase','lower-case'], _case_lower),
+    (['random','randomcase','random-case'], _case_random),
+    (['sticky','stickycase','sticky-case','studly','studlycase','studly-case'], _case_sticky),
+):
+    for _alias in _aliases:
+        _CASES[_alias] = _transform
+del _aliases, _transform, _alias
+
+
+def convert_case(text, case='normal', sep=' '):
+    """
+    Converts the space separated words in text to the given case.
+
+    Unknown cases leave the words as they are.
+    """
+    transform = _CASES.get(case)
+    if transform is None:
+        transform = _CASES.get(case.lower(), _case_normal)
+    return transform(text, sep)
+
+
+def _writable(file):
+    """
+    Returns file, or a text stream reopened from its fd
+    if file cannot be written to as it is.
     """
-    args2 = []
-    case = case.lower()
-    
     try:
         file.write('')
     except TypeError:
@@ -417,219 +1346,198 @@ def fancyprint(*args, sep: str = ' ', start: str = '', end: str = '\n', fore: st
             file = open(os.readlink('/proc/' + str(os.getpid()) + '/fd/' + str(file.fileno())),'w')
     except io.UnsupportedOperation:
         file = open(os.readlink('/proc/' + str(os.getpid()) + '/fd/' + str(file.fileno())),'w')
-    
+    return file
+
+
+def _fancyformat(args, sep, start, end, fore, back, color, case, colors):
+    """
+    Builds the text fancyprint() writes for args.
+    """
     if fore == '' or back == '':
         if fore == '':
             fore = color
         if back == '':
             back = color
         color = ''
-    
-    for arg in args:
-        arg = str(arg).split(' ')
-        for argument in arg:
-            args2.append(argument)
-    
-    if case in ['camel','camelcase','lowercamel','lowercamelcase','camel-case','lowercamel-case','lower-camelcase','lower-camel-case','lower-camel']:
-        joinlist = [args2[0][0].lower() + args2[0][1::]]
-        args2.pop(0)
-        for string in args2:
-            string = string.replace(',','').replace('-','').replace('\'','').replace('\"','').replace('<','').replace('>','').replace('_','').replace('!','').replace('?','').replace('$','').replace('%','').replace('@','').replace('^','').replace('&','').replace('*','').replace('`','').replace('~','').replace('\\','').replace('/','').replace('{','').replace('}','').replace('[','').replace(']','').replace(':','').replace(';','').replace('+','').replace('=','')
-            joinlist.append(string[0].upper() + string[1::])
-                
-        if (hasattr(sys.stdout, "isatty") or hasattr(file, "isatty")) and not sys.stdout.isatty() or not file.isatty() or 'TERMINAL-COLOR' not in os.environ:
-            text = str(start + sep.join(joinlist) + end)
-        else:    
-            text = str(color + fore + back + start + ''.join(joinlist) + end + '\33[0m')
-    
-    elif case in ['train','traincase','train-case']:
-        joinlist = [args[0][0].upper() + args2[0][1::]]
-        for string in args2:
-            if string == args2[0]:
-                continue
-            else:
-                joinlist.append(string.lower())
 
-        if (hasattr(sys.stdout, "isatty") or hasattr(file, "isatty")) and not sys.stdout.isatty() or not file.isatty() or 'TERMINAL-COLOR' not in os.environ:
-            text = str(start + sep.join(joinlist) + end)
-        else:    
-            text = str(color + fore + back + start + '-'.join(joinlist) + end + '\33[0m')
-    
-    elif case in ['sentence','sentencecase','sentence-case']:
-        joinlist = [args[0][0].upper() + args2[0][1::]]
-        for string in args2:
-            if string == args2[0]:
-                continue
-            else:
-                joinlist.append(string)
-
-        if (hasattr(sys.stdout, "isatty") or hasattr(file, "isatty")) and not sys.stdout.isatty() or not file.isatty() or 'TERMINAL-COLOR' not in os.environ:
-            text = str(start + sep.join(joinlist) + end)
-        else:    
-            text = str(color + fore + back + start + ' '.join(joinlist) + end + '\33[0m')
-
-    elif case in ['leet','leetcase','leet-case']:
-        joinlist = []
-        for string in args2:
-            joinlist.append(string.replace('e','3').replace('E','3').replace('i','1').replace('I','1').replace('s','5').replace('S','5').replace('z','2').replace('Z','2').replace('a','4').replace('A','4').replace('b','8').replace('B','8').replace('o','0').replace('O','0'))
-
-        if (hasattr(sys.stdout, "isatty") or hasattr(file, "isatty")) and not sys.stdout.isatty() or not file.isatty() or 'TERMINAL-COLOR' not in os.environ:
-            text = str(start + sep.join(joinlist) + end)
-        else:    
-            text = str(color + fore + back + start + sep.join(joinlist) + end + '\33[0m')
-    
-    elif case in ['pascal','pascalcase','pascal-case','capitalcamel','capital-camel','capitalcamel-case','capital-camelcase','capital-camel-case','capitalcamelcase']:
-        joinlist = []
-        for string in args2:
-            joinlist.append(string[0].upper() + string[1::])
-
-        if (hasattr(sys.stdout, "isatty") or hasattr(file, "isatty")) and not sys.stdout.isatty() or not file.isatty() or 'TERMINAL-COLOR' not in os.environ:
-            text = str(start + sep.join(joinlist) + end)
-        else:    
-            text = str(color + fore + back + start + ''.join(joinlist) + end + '\33[0m')
-    
-    elif case in ['snake','snakecase','snake-case','snake_case','c','ccase','c-case','c_case']:
-        joinlist = []
-        for arg in args2:
-            joinlist.append(arg.lower())
-
-        if (hasattr(sys.stdout, "isatty") or hasattr(file, "isatty")) and not sys.stdout.isatty() or not file.isatty() or 'TERMINAL-COLOR' not in os.environ:
-            text = str(start + sep.join(joinlist) + end)
-        else:    
-            text = str(color + fore + back + start + '_'.join(joinlist) + end + '\33[0m')
-    
-    elif case in ['flat','flatcase','flat-case']:
-        joinlist = []
-        for arg in args2:
-            joinlist.append(arg.lower())
-
-        if (hasattr(sys.stdout, "isatty") or hasattr(file, "isatty")) and not sys.stdout.isatty() or not file.isatty() or 'TERMINAL-COLOR' not in os.environ:
-            text = str(start + sep.join(joinlist) + end)
-        else:    
-            text = str(color + fore + back + start + ''.join(joinlist) + end + '\33[0m')
-    
-    elif case in ['spinal','spinalcase','spinal-case','hyphen','hyphencase','hyphen-case','dash','dashcase','dash-case']:
-        joinlist = []
-        for arg in args2:
-            joinlist.append()
-
-        if (hasattr(sys.stdout, "isatty") or hasattr(file, "isatty")) and not sys.stdout.isatty() or not file.isatty() or 'TERMINAL-COLOR' not in os.environ:
-            text = str(start + sep.join(joinlist) + end)
-        else:    
-            text = str(color + fore + back + start + '-'.join(joinlist) + end + '\33[0m')
-    
-    elif case in ['macro','macrocase','macro-case']:
-        joinlist = []
-        for arg in args2:
-            joinlist.append(arg.upper())
-
-        if (hasattr(sys.stdout, "isatty") or hasattr(file, "isatty")) and not sys.stdout.isatty() or not file.isatty() or 'TERMINAL-COLOR' not in os.environ:
-            text = str(start + sep.join(joinlist) + end)
-        else:    
-            text = str(color + fore + back + start + "_".join(joinlist) + end + '\33[0m')
-    
-    elif case in ['cobol','cobolcase','cobol-case']:
-        joinlist = []
-        for arg in args2:
-            joinlist.append(arg.upper())
-
-        if (hasattr(sys.stdout, "isatty") or hasattr(file, "isatty")) and not sys.stdout.isatty() or not file.isatty() or 'TERMINAL-COLOR' not in os.environ:
-            text = str(start + sep.join(joinlist) + end)
-        else:    
-            text = str(color + fore + back + start + '-'.join(joinlist) + end + '\33[0m')
-    
-    elif case in ['kebab','kebabcase','kebab-case','lisp','lispcase','lisp-case','css','csscase','css-case']:
-        joinlist = []
-        for arg in args2:
-            joinlist.append(arg.lower())
-
-        if (hasattr(sys.stdout, "isatty") or hasattr(file, "isatty")) and not sys.stdout.isatty() or not file.isatty() or 'TERMINAL-COLOR' not in os.environ:
-            text = str(start + sep.join(joinlist) + end)
-        else:    
-            text = str(color + fore + back + start + '-'.join(joinlist) + end + '\33[0m')
-    
-    elif case in ['upper','uppercase','upper-case']:
-        joinlist = []
-        for string in args2:
-            joinlist.append(string.upper())
-
-        if (hasattr(sys.stdout, "isatty") or hasattr(file, "isatty")) and not sys.stdout.isatty() or not file.isatty() or 'TERMINAL-COLOR' not in os.environ:
-            text = str(start + sep.join(joinlist) + end)
-        else:    
-            text = str(color + fore + back + start + sep.join(joinlist) + end + '\33[0m')
-    
-    elif case in ['lower','lowercase','lower-case']:
-        joinlist = []
-        for string in args2:
-            joinlist.append(string.lower())
-
-        if (hasattr(sys.stdout, "isatty") or hasattr(file, "isatty")) and not sys.stdout.isatty() or not file.isatty() or 'TERMINAL-COLOR' not in os.environ:
-            text = str(start + sep.join(joinlist) + end)
-        else:    
-            text = str(color + fore + back + start + sep.join(joinlist) + end + '\33[0m')
-    
-    elif case in ['random','randomcase','random-case']:
-        joinlist = []
-        for string in args2:
-            secondjoinlist = []
-            for char in string:
-                char = random.choice([char.upper(),char.lower()])
-                secondjoinlist.append(char)
-            temp = ''.join(secondjoinlist)
-            joinlist.append(temp)
-
-        if (hasattr(sys.stdout, "isatty") or hasattr(file, "isatty")) and not sys.stdout.isatty() or not file.isatty() or 'TERMINAL-COLOR' not in os.environ:
-            text = str(start + sep.join(args2) + end)
-        else:    
-            text = str(color + fore + back + start + sep.join(args2) + end + '\33[0m')
-    
-    elif case in ['sticky','stickycase','sticky-case','studly','studlycase','studly-case']:
-        joinlist = []
-        for string in args2:
-            secondjoinlist = []
-            for char in string:
-                if char.isupper():
-                    secondjoinlist.append(char.lower())
-                elif char.islower():
-                    secondjoinlist.append(char.upper())
-                else:
-                    secondjoinlist.append(char)
-            joinlist.append(''.join(secondjoinlist))
+    transform = _CASES.get(case)
+    if transform is None:
+        transform = _CASES.get(case.lower(), _case_normal)
+    joined = transform(' '.join([str(arg) for arg in args]), sep)
 
-        if (hasattr(sys.stdout, "isatty") or hasattr(file, "isatty")) and not sys.stdout.isatty() or not file.isatty() or 'TERMINAL-COLOR' not in os.environ:
-            text = str(start + sep.join(joinlist) + end)
-        else:    
-            text = str(color + fore + back + start + sep.join(joinlist) + end + '\33[0m')
-    
-    else:
-        joinlist = []
-        for word in args2:
-            joinlist.append(''.join(word))
-
-        if (hasattr(sys.stdout, "isatty") or hasattr(file, "isatty")) and not sys.stdout.isatty() or not file.isatty() or 'TERMINAL-COLOR' not in os.environ:
-            text = str(start + sep.join(joinlist) + end)
-        else:    
-            text = str(color + fore + back + start + sep.join(joinlist) + end + '\33[0m')
+    if not colors:
+        return start + joined + end
+    return color + fore + back + start + joined + end + '\33[0m'
+
+
+def fancyprint(*args, sep: str = ' ', start: str = '', end: str = '\n', fore: str = '', back: str = '', color: str = '\33[0m', case: str = 'normal', file=sys.stdout, **kwargs):
+    """
+    An very improved version of print().
     
-    file.write(color + start + text + end + '\33[0m')
+    Works the same, but you can change the case, color, and more.
+    """
+    global _gc_calls
+
+    file = _writable(file)
+    text = _fancyformat(args, sep, start, end, fore, back, color, case, TerminalCapabilities.get(file).colors)
+
+    file.write(text)
     file.flush()
 
-    cleanmemory()
+    if _gc_interval:
+        _gc_calls += 1
+        if _gc_calls >= _gc_interval:
+            _gc_calls = 0
+            cleanmemory()
 
     return text
 
-def cleanmemory():
-    try:
-        sys.stdout.flush()
-        sys.__stdout__.flush()
-        sys.stdin.flush()
-        sys.__stdin__.flush()
-        sys.stderr.flush()
-        sys.__stderr__.flush()
-
-        gc.unfreeze()
-        for obj in gc.get_objects():
-            del obj
+
+class FancyWriter(object):
+    """
+    Buffers fancyprint() output and writes it out in large chunks.
+
+     file - The stream to write to (stdout by default)
+     buffer_size - Flush once this many characters are buffered
+     flush_interval - Flush once this many seconds passed since
+                      the last flush (None to only flush on size).
+                      This is only checked when something is
+                      written, there is no timer: whatever was
+                      written before a pause stays in the buffer
+                      until the next write or flush()
+
+    Anything left in the buffer is written when the
+    context manager exits or flush()/close() is called.
+    """
+    def __init__(self, file=sys.stdout, buffer_size=65536, flush_interval=None):
+        self.file = _writable(file)
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self._colors = TerminalCapabilities.get(self.file).colors
+        self._buffer = io.StringIO()
+        self._size = 0
+        self._last_flush = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return f'<FancyWriter {self.file!r} buffered={self._size}>'
+
+    def fancyprint(self, *args, sep: str = ' ', start: str = '', end: str = '\n', fore: str = '', back: str = '', color: str = '\33[0m', case: str = 'normal', **kwargs):
+        """
+        Same as club.fancyprint(), but buffered.
+        """
+        text = _fancyformat(args, sep, start, end, fore, back, color, case, self._colors)
+        self.write(text)
+        return text
+
+    def write(self, text):
+        self._size += self._buffer.write(text)
+        if self._size >= self.buffer_size:
+            self.flush()
+        elif self.flush_interval is not None and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self._size:
+            self.file.write(self._buffer.getvalue())
+            self._buffer.seek(0)
+            self._buffer.truncate()
+            self._size = 0
+        self.file.flush()
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+
+
+def fancyprint_many(iterable, sep: str = ' ', start: str = '', end: str = '\n', fore: str = '', back: str = '', color: str = '\33[0m', case: str = 'normal', file=sys.stdout, buffer_size=65536, flush_interval=None, **kwargs):
+    """
+    Calls fancyprint() for every item of iterable, but
+    buffers the output so it is written in large chunks
+    (see FancyWriter for buffer_size and flush_interval).
+
+    Tuples are unpacked as the arguments of one call,
+    anything else is printed as a single argument.
+
+    Returns the amount of lines printed.
+    """
+    count = 0
+    with FancyWriter(file, buffer_size, flush_interval) as writer:
+        colors = writer._colors
+        write = writer.write
+        for item in iterable:
+            if type(item) is not tuple:
+                item = (item,)
+            write(_fancyformat(item, sep, start, end, fore, back, color, case, colors))
+            count += 1
+    return count
+
+
+class GCPolicy(object):
+    """
+    When fancyprint() is allowed to force a garbage collection.
+
+     NEVER - cleanmemory() never collects, even when called
+     EVERY - fancyprint() calls cleanmemory() every N calls
+     EXPLICIT - only explicit cleanmemory() calls collect (default)
+    """
+    NEVER = 'never'
+    EVERY = 'every'
+    EXPLICIT = 'explicit'
+
+
+_gc_policy = GCPolicy.EXPLICIT
+_gc_interval = 0
+_gc_calls = 0
+
+
+def set_gc_policy(policy, every=1000):
+    """
+    Sets the module's GCPolicy. The every argument is
+    the amount of fancyprint() calls between collections
+    and is only used by GCPolicy.EVERY.
+    """
+    global _gc_policy, _gc_interval, _gc_calls
+
+    if policy not in (GCPolicy.NEVER, GCPolicy.EVERY, GCPolicy.EXPLICIT):
+        raise ValueError(f"Unknown gc policy {policy!r}!")
+    if policy == GCPolicy.EVERY and every < 1:
+        raise ValueError("every must be at least 1!")
+
+    _gc_policy = policy
+    _gc_interval = every if policy == GCPolicy.EVERY else 0
+    _gc_calls = 0
+
+
+def get_gc_policy():
+    """
+    Returns the module's current GCPolicy.
+    """
+    return _gc_policy
+
+
+def cleanmemory():
+    """
+    Flushes the standard streams and runs a full garbage collection,
+    unless the gc policy is GCPolicy.NEVER.
+    """
+    if _gc_policy == GCPolicy.NEVER:
+        return 0
+
+    try:
+        sys.stdout.flush()
+        sys.__stdout__.flush()
+        sys.stdin.flush()
+        sys.__stdin__.flush()
+        sys.stderr.flush()
+        sys.__stderr__.flush()
+
+        gc.unfreeze()
 
         gc.collect(2)
         gc.collect(1)
@@ -651,7 +1559,7 @@ def exit(message=None):
         raise SystemExit(str(message))
 
 
-def typer(text, delay=0.08, out=sys.stdout):
+def typer(text, delay=0.08, out=sys.stdout, fps=30, wait=True):
     """
     Like print(), but looks like someone is typing.
     
@@ -659,11 +1567,286 @@ def typer(text, delay=0.08, out=sys.stdout):
     seconds between characters, and out is
     the stream to send the characters
     to (stdout by default)
+
+    The characters due in a frame (fps per second) go out in
+    one write. With wait=False it returns the Animator typing
+    in the background instead of waiting for it.
+    """
+    animator = Animator(fps, out)
+    animator.add(Typer(text, delay))
+    if wait:
+        animator.run()
+        return None
+    animator.start()
+    return animator
+
+
+def _delta(old, new):
+    """
+    Returns what turns old into new on the current line.
+    """
+    if new.startswith(old):
+        return new[len(old):]
+    same = 0
+    limit = min(len(old), len(new))
+    while same < limit and old[same] == new[same]:
+        same += 1
+    pad = max(len(old) - len(new), 0)
+    return '\b' * (len(old) - same) + new[same:] + ' ' * pad + '\b' * pad
+
+
+class Animation(object):
+    """
+    Something an Animator draws frame by frame. Subclasses give
+    text(elapsed), what it shows elapsed seconds after it started,
+    and set done when it is over.
+
+     x, y - Where it goes on the Animator's Screen (without a
+            Screen it goes wherever the cursor is)
+     style - The escape sequence it is drawn with
+     endless - It is only over once stop() is called, which the
+               Animator does when it stops
+    """
+    endless = False
+
+    def __init__(self, x=0, y=0, style=''):
+        self.x = x
+        self.y = y
+        self.style = style
+        self.done = False
+        self.started = None
+        self.shown = ''
+
+    def text(self, elapsed):
+        raise NotImplementedError
+
+    def stop(self):
+        self.done = True
+
+
+class Typer(Animation):
+    """
+    Shows text one character per delay seconds.
+    """
+    def __init__(self, text, delay=0.08, x=0, y=0, style=''):
+        super().__init__(x, y, style)
+        self.content = str(text)
+        self.delay = delay
+
+    def text(self, elapsed):
+        count = int(elapsed / self.delay) + 1 if self.delay > 0 else len(self.content)
+        if count >= len(self.content):
+            self.done = True
+        return self.content[:count]
+
+
+class Spinner(Animation):
     """
-    for char in text:
-        out.write(char)
-        out.flush()
-        time.sleep(delay)
+    Cycles through frames (one per interval seconds) in front of
+    label, for duration seconds or until stop(). With clear it
+    erases itself when it stops.
+    """
+    def __init__(self, label='', frames='|/-\\', interval=0.1, duration=None, clear=False, x=0, y=0, style=''):
+        super().__init__(x, y, style)
+        self.label = label
+        self.frames = frames
+        self.interval = interval
+        self.duration = duration
+        self.endless = duration is None
+        self.clear = clear
+
+    def text(self, elapsed):
+        if self.duration is not None and elapsed >= self.duration:
+            self.done = True
+        if self.done and self.clear:
+            return ''
+        frame = self.frames[int(elapsed / self.interval) % len(self.frames)]
+        return f'{frame} {self.label}' if self.label else frame
+
+
+class Marquee(Animation):
+    """
+    Scrolls text through a window width characters wide, one
+    character per interval seconds, for duration seconds or until
+    stop().
+    """
+    def __init__(self, text, width=20, interval=0.1, duration=None, x=0, y=0, style=''):
+        super().__init__(x, y, style)
+        loop = str(text) + '   '
+        self.loop = loop * (width // len(loop) + 2)
+        self.period = len(loop)
+        self.width = width
+        self.interval = interval
+        self.duration = duration
+        self.endless = duration is None
+
+    def text(self, elapsed):
+        if self.duration is not None and elapsed >= self.duration:
+            self.done = True
+        offset = int(elapsed / self.interval) % self.period
+        return self.loop[offset:offset + self.width]
+
+
+class Animator(object):
+    """
+    Runs Animations off one clock at fps frames per second, with a
+    single write per frame however many there are.
+
+    Without a Screen the animations write to file one after the
+    other, like print() would. With one they all run at the same
+    time, each at its x and y, and a frame is one Screen.refresh().
+
+    run() animates until they are all done, start() does it from
+    a background thread (until stop()) and run_async() as an
+    asyncio task. As a context manager it starts, and waits for
+    the animations at the end.
+    """
+    def __init__(self, fps=30, file=sys.stdout, screen=None):
+        import threading
+
+        self.fps = fps
+        self.file = file
+        self.screen = screen
+        self.frames = 0
+        self._animations = []
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._finish = False
+        self._thread = None
+
+    def __repr__(self):
+        return f'<Animator {len(self._animations)} animations at {self.fps} fps>'
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop(wait=exc_type is None)
+
+    def add(self, animation):
+        with self._lock:
+            self._animations.append(animation)
+        return animation
+
+    def tick(self, now=None):
+        """
+        Draws one frame, returns how many characters it wrote.
+        """
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            animations = list(self._animations)
+
+        finished = []
+        if self.screen is not None:
+            for animation in animations:
+                if animation.started is None:
+                    animation.started = now
+                text = animation.text(now - animation.started)
+                if text != animation.shown:
+                    self.screen.put(animation.x, animation.y, text.ljust(len(animation.shown)), animation.style)
+                    animation.shown = text
+                if animation.done:
+                    finished.append(animation)
+            written = self.screen.refresh()
+        else:
+            out = []
+            for animation in animations:
+                if animation.started is None:
+                    animation.started = now
+                text = animation.text(now - animation.started)
+                delta = _delta(animation.shown, text)
+                if delta:
+                    out.append(animation.style + delta + '\33[0m' if animation.style else delta)
+                animation.shown = text
+                if not animation.done:
+                    break
+                # The next one starts in the same frame.
+                finished.append(animation)
+            data = ''.join(out)
+            if data:
+                self.file.write(data)
+                self.file.flush()
+            written = len(data)
+
+        if finished:
+            with self._lock:
+                self._animations = [animation for animation in self._animations if animation not in finished]
+        self.frames += 1
+        return written
+
+    def _next_frame(self, due):
+        """
+        Returns when the frame after the one due at due is, and how
+        long until then. Frames that were missed are skipped.
+        """
+        now = time.monotonic()
+        due += 1 / self.fps
+        if due < now:
+            due = now
+        return due, due - now
+
+    def run(self):
+        """
+        Animates until every animation is done.
+        """
+        due = time.monotonic()
+        while self._animations:
+            self.tick()
+            due, delay = self._next_frame(due)
+            time.sleep(delay)
+
+    async def run_async(self):
+        """
+        Like run(), for asyncio.
+        """
+        import asyncio
+
+        due = time.monotonic()
+        while self._animations:
+            self.tick()
+            due, delay = self._next_frame(due)
+            await asyncio.sleep(delay)
+
+    def _loop(self):
+        due = time.monotonic()
+        while not self._stopping.is_set():
+            if self._animations:
+                self.tick()
+            elif self._finish:
+                return
+            due, delay = self._next_frame(due)
+            self._stopping.wait(delay)
+
+    def start(self):
+        """
+        Animates from a background thread until stop().
+        """
+        import threading
+
+        self._stopping.clear()
+        self._finish = False
+        self._thread = threading.Thread(target=self._loop, name='club.Animator', daemon=True)
+        self._thread.start()
+
+    def stop(self, wait=False):
+        """
+        Stops the background thread, with wait only once every
+        animation is done. Endless ones are stopped either way.
+        """
+        if self._thread is None:
+            return
+        if wait:
+            with self._lock:
+                for animation in self._animations:
+                    if animation.endless:
+                        animation.stop()
+            self._finish = True
+        else:
+            self._stopping.set()
+        self._thread.join()
+        self._thread = None
 
 
 def center_text(text):
@@ -671,265 +1854,1034 @@ def center_text(text):
     Adds spaces to make a string
     be centered in the terminal.
     """
-    space_count = (os.get_terminal_size().columns / 2) - (len(str(text)) / 2)
+    space_count = (TerminalCapabilities.get(sys.stdout).width / 2) - (len(str(text)) / 2)
     spaces = (' ' * int(round(space_count, 0)))
     return spaces + str(text)
 
 
-def Stack(object):
+class Stack(object):
     """
     A basic stack object.
+
+    The items are stored on the tail of a list, so push(),
+    pop() and top() are O(1). Indexing, iteration and the
+    start argument go from the top of the stack down.
+
+    If maxlen is given the stack is bounded, and pushing
+    onto a full stack raises an exception. So do +, * and
+    their in-place versions when the result would not fit
+    (the result keeps the maxlen of the left operand).
     """
-    def __init__(self, start=[]):
-        self.stack = []
-        for x in self.stack:
-            self.push(x)
-        self.reverse()
-        
+    __slots__ = ('_items', 'maxlen')
+
+    def __init__(self, start=(), maxlen=None):
+        self._items = list(start)
+        self._items.reverse()
+        self.maxlen = maxlen
+        if maxlen is not None and len(self._items) > maxlen:
+            raise Exception("Overflow while attempting to create stack!")
+
     def push(self, obj):
-        self.stack = [obj] + self.stack
-        
+        if self.maxlen is not None and len(self._items) >= self.maxlen:
+            raise Exception("Overflow while attempting to push stack!")
+        self._items.append(obj)
+
+    def push_many(self, objs):
+        """
+        Pushes every item of objs, the last one ends up on top.
+        """
+        if self.maxlen is None:
+            self._items.extend(objs)
+            return
+        objs = list(objs)
+        if len(self._items) + len(objs) > self.maxlen:
+            raise Exception("Overflow while attempting to push stack!")
+        self._items.extend(objs)
+
     def pop(self):
-        if not self.stack:
+        if not self._items:
             raise Exception("Underflow while attempting to pop stack!")
-        top, *self.stack = self.stack
-        return top
-    
+        return self._items.pop()
+
+    def pop_many(self, n):
+        """
+        Pops n items and returns them, top first.
+        """
+        if n > len(self._items):
+            raise Exception("Underflow while attempting to pop stack!")
+        if n <= 0:
+            return []
+        popped = self._items[-n:]
+        del self._items[-n:]
+        popped.reverse()
+        return popped
+
     def top(self):
-        if not self.stack:
+        if not self._items:
             raise Exception("Underflow while attempting to get top of stack!")
-        return self.stack[0]
-    
+        return self._items[-1]
+
     def empty(self):
-        return not self.stack
-    
+        return not self._items
+
+    def full(self):
+        return self.maxlen is not None and len(self._items) >= self.maxlen
+
+    def _topfirst(self):
+        return self._items[::-1]
+
     def __repr__(self):
-        return f'<Stack {repr(self.stack)}>'
-    
+        return f'<Stack {repr(self._topfirst())}>'
+
     def __str__(self):
-        return str(self.stack)
-    
+        return str(self._topfirst())
+
     def __eq__(self, other):
-        return self.stack == other.stack
-        
+        if not isinstance(other, Stack):
+            return NotImplemented
+        return self._items == other._items
+
     def __len__(self):
-        return len(self.stack)
-    
+        return len(self._items)
+
+    def __bool__(self):
+        return bool(self._items)
+
+    def __iter__(self):
+        return reversed(self._items)
+
     def __add__(self, other):
-        return Stack(self.stack + other.stack)
-    
+        return Stack(self._topfirst() + other._topfirst(), self.maxlen)
+
     def __mul__(self, reps):
-        return Stack(self.stack * reps)
-    
+        return Stack(self._topfirst() * reps, self.maxlen)
+
     def __getitem__(self, offset):
-        return self.stack[offset]
-    
-    def __getattr__(self, name):
-        return getattr(self.stack, name)
-    
-    def __new__(cls):
-        return object.__new__(cls)
-    
+        if isinstance(offset, slice):
+            return self._topfirst()[offset]
+        if not -len(self._items) <= offset < len(self._items):
+            raise IndexError("Stack index out of range!")
+        return self._items[-offset - 1]
+
     def __iadd__(self, other):
-        return Stack(self.stack + other.stack)
-    
+        self._check_room(len(other._items))
+        self._items[:0] = other._items
+        return self
+
     def __imul__(self, reps):
-        return Stack(self.stack * reps)
-    
-    def __unicode__(self):
-        return str(self.stack).encode('utf8')
-    
+        self._check_room(len(self._items) * (max(reps, 1) - 1))
+        self._items *= reps
+        return self
+
+    def _check_room(self, count):
+        if self.maxlen is not None and len(self._items) + count > self.maxlen:
+            raise Exception("Overflow while attempting to push stack!")
+
     def __sizeof__(self):
-        return sys.getsizeof(self.stack)
+        return object.__sizeof__(self) + sys.getsizeof(self._items)
 
 
 class Set(object):
-    def __init__(self, value=[]):
-        self.data = {}
-        self.concat(value)
-        
-    def intersect(self, other):
-        res = {}
-        for x in other:
-            if x in self.data:
-                res[x] = None
-        return Set(res.keys)
-    
-    def union(self, other):
-        res = {}
-        for x in other:
-            res[x] = None
-        for x in self.data.keys():
-            res[x] = None
-        return Set(res.keys())
-    
+    """
+    A set object that can also be indexed.
+
+    The elements live in a native set, or in a dict if ordered
+    is True so that insertion order is kept. Indexing uses a
+    list of the elements that is rebuilt after a mutation.
+    """
+    __slots__ = ('data', 'ordered', '_index')
+
+    def __init__(self, value=(), ordered=False):
+        self.ordered = ordered
+        self.data = dict.fromkeys(_set_data(value)) if ordered else set(_set_data(value))
+        self._index = None
+
+    @classmethod
+    def _wrap(cls, data, ordered):
+        new = object.__new__(cls)
+        new.data, new.ordered, new._index = data, ordered, None
+        return new
+
+    def add(self, value):
+        if self.ordered:
+            self.data[value] = None
+        else:
+            self.data.add(value)
+        self._index = None
+
+    def discard(self, value):
+        if self.ordered:
+            self.data.pop(value, None)
+        else:
+            self.data.discard(value)
+        self._index = None
+
+    def remove(self, value):
+        if value not in self.data:
+            raise KeyError(value)
+        self.discard(value)
+
     def concat(self, value):
-        for x in value:
-            self.data[x] = None
-                
+        if self.ordered:
+            self.data.update(dict.fromkeys(_set_data(value)))
+        else:
+            self.data.update(_set_data(value))
+        self._index = None
+
+    def union(self, other):
+        if self.ordered:
+            data = self.data.copy()
+            data.update(dict.fromkeys(_set_data(other)))
+            return Set._wrap(data, True)
+        return Set._wrap(self.data.union(_set_data(other)), False)
+
+    def intersect(self, other):
+        if self.ordered:
+            lookup = _set_lookup(other)
+            return Set._wrap({x: None for x in self.data if x in lookup}, True)
+        return Set._wrap(self.data.intersection(_set_data(other)), False)
+
+    intersection = intersect
+
+    def difference(self, other):
+        if self.ordered:
+            lookup = _set_lookup(other)
+            return Set._wrap({x: None for x in self.data if x not in lookup}, True)
+        return Set._wrap(self.data.difference(_set_data(other)), False)
+
+    def symmetric_difference(self, other):
+        if self.ordered:
+            new = Set._wrap(self.data.copy(), True)
+            new ^= other
+            return new
+        return Set._wrap(self.data.symmetric_difference(_set_data(other)), False)
+
     def __len__(self):
-        return len(self.data.keys())
-    
-    def __new__(cls):
-        return object.__new__(cls)
-    
+        return len(self.data)
+
+    def __contains__(self, value):
+        return value in self.data
+
+    def __iter__(self):
+        return iter(self.data)
+
     def __getitem__(self, ix):
-        return list(self.data.keys())[ix]
-     
+        if self._index is None:
+            self._index = list(self.data)
+        return self._index[ix]
+
     def __and__(self, other):
         return self.intersect(other)
-    
+
     def __or__(self, other):
         return self.union(other)
-    
+
+    def __sub__(self, other):
+        return self.difference(other)
+
+    def __xor__(self, other):
+        return self.symmetric_difference(other)
+
+    def __ior__(self, other):
+        self.concat(other)
+        return self
+
+    def __iand__(self, other):
+        if self.ordered:
+            lookup = _set_lookup(other)
+            self.data = {x: None for x in self.data if x in lookup}
+        else:
+            self.data.intersection_update(_set_data(other))
+        self._index = None
+        return self
+
+    def __isub__(self, other):
+        if self.ordered:
+            pop = self.data.pop
+            for x in _set_data(other):
+                pop(x, None)
+        else:
+            self.data.difference_update(_set_data(other))
+        self._index = None
+        return self
+
+    def __ixor__(self, other):
+        if self.ordered:
+            data = self.data
+            for x in _set_lookup(other):
+                if x in data:
+                    del data[x]
+                else:
+                    data[x] = None
+        else:
+            self.data.symmetric_difference_update(_set_data(other))
+        self._index = None
+        return self
+
     def __repr__(self):
-        data = str(list(self.data.keys()))
-        data[0] = '{'
-        data[len(data)] = '}'
-        return f'<Set {data}>'
-    
+        return f'<Set {self}>'
+
     def __str__(self):
-        data = str(list(self.data.keys()))
-        data[0] = '{'
-        data[len(data)] = '}'
-        return data
-    
+        return '{' + ', '.join(map(repr, self.data)) + '}'
+
     def __eq__(self, other):
-        return self.data == other.data
+        if isinstance(other, Set):
+            other = other.data
+        elif not isinstance(other, (set, frozenset)):
+            return NotImplemented
+        return _set_view(self.data) == _set_view(other)
 
+    __hash__ = None
 
-class BinaryTree(object):
-    def __init__(self):
-        self.tree = EmptyNode()
-    
-    def __repr__(self):
-        return f'<BinaryTree {repr(self.tree)}>'
-    
-    def lookup(self, value):
-        return self.tree.lookup(value)
-    
-    def insert(self, value):
-        self.tree = self.tree.insert(value)
+
+def _set_view(data):
+    return data.keys() if isinstance(data, dict) else data
+
+
+def _set_data(value):
+    """
+    Unwraps a Set to its native data, anything else is returned as is.
+    """
+    return value.data if isinstance(value, Set) else value
 
 
-class EmptyNode(object):
+def _set_lookup(value):
     """
-    A placeholder for BinaryNode()
+    Returns something with an O(1) in for the elements of value.
     """
+    value = _set_data(value)
+    if isinstance(value, (set, frozenset, dict)):
+        return value
+    return dict.fromkeys(value)
+
+
+class BinaryTree(object):
+    """
+    A binary search tree of unique values.
+
+    Lookups and inserts are iterative, and unless balanced is
+    False the tree is kept balanced (AVL), so both stay O(log n)
+    even for sorted input.
+    """
+    def __init__(self, balanced=True):
+        self.tree = None
+        self.balanced = balanced
+        self._size = 0
+
     def __repr__(self):
-        return '*'
-    
+        return f'<BinaryTree {repr(self.tree) if self.tree is not None else "*"}>'
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, value):
+        return self.lookup(value)
+
+    def __iter__(self):
+        stack = []
+        node = self.tree
+        while stack or node is not None:
+            if node is not None:
+                stack.append(node)
+                node = node.left
+            else:
+                node = stack.pop()
+                yield node.data
+                node = node.right
+
     def lookup(self, value):
+        node = self.tree
+        while node is not None:
+            if value < node.data:
+                node = node.left
+            elif node.data < value:
+                node = node.right
+            else:
+                return True
         return False
-    
+
     def insert(self, value):
-        return BinaryNode(self, value, self)
+        node = self.tree
+        if node is None:
+            self.tree = BinaryNode(None, value, None)
+            self._size = 1
+            return
+
+        path = []
+        while True:
+            path.append(node)
+            if value < node.data:
+                if node.left is None:
+                    node.left = BinaryNode(None, value, None)
+                    break
+                node = node.left
+            elif node.data < value:
+                if node.right is None:
+                    node.right = BinaryNode(None, value, None)
+                    break
+                node = node.right
+            else:
+                return
+
+        self._size += 1
+        if self.balanced:
+            self._rebalance(path)
+
+    def delete(self, value):
+        """
+        Removes value from the tree, raises KeyError if it is not there.
+        """
+        path = []
+        node = self.tree
+        while node is not None:
+            if value < node.data:
+                path.append(node)
+                node = node.left
+            elif node.data < value:
+                path.append(node)
+                node = node.right
+            else:
+                break
+        if node is None:
+            raise KeyError(value)
+
+        if node.left is not None and node.right is not None:
+            # Swap in the in-order successor and remove that node instead.
+            path.append(node)
+            successor = node.right
+            while successor.left is not None:
+                path.append(successor)
+                successor = successor.left
+            node.data = successor.data
+            node = successor
+
+        child = node.left if node.left is not None else node.right
+        if path:
+            parent = path[-1]
+            if parent.left is node:
+                parent.left = child
+            else:
+                parent.right = child
+        else:
+            self.tree = child
+
+        self._size -= 1
+        if self.balanced:
+            self._rebalance(path)
+
+    def min(self):
+        node = self.tree
+        if node is None:
+            raise ValueError("min() of an empty BinaryTree!")
+        while node.left is not None:
+            node = node.left
+        return node.data
+
+    def max(self):
+        node = self.tree
+        if node is None:
+            raise ValueError("max() of an empty BinaryTree!")
+        while node.right is not None:
+            node = node.right
+        return node.data
+
+    def range(self, lo, hi):
+        """
+        Yields the values v with lo <= v < hi in order.
+        """
+        stack = []
+        node = self.tree
+        while stack or node is not None:
+            if node is not None:
+                if node.data < lo:
+                    node = node.right
+                else:
+                    stack.append(node)
+                    node = node.left
+            else:
+                node = stack.pop()
+                if not node.data < hi:
+                    return
+                yield node.data
+                node = node.right
+
+    def bulk_load(self, sorted_iterable):
+        """
+        Adds the values of a sorted iterable, rebuilding
+        the tree perfectly balanced in O(n).
+        """
+        values = []
+        for value in sorted_iterable:
+            if values and not values[-1] < value:
+                if value < values[-1]:
+                    raise ValueError("bulk_load() needs sorted input!")
+                continue
+            values.append(value)
+
+        if self.tree is not None:
+            merged = []
+            for value in heapq.merge(self, values):
+                if not merged or merged[-1] < value:
+                    merged.append(value)
+            values = merged
+
+        # The build allocates nothing but nodes, running the cyclic gc
+        # over them every few hundred allocations only slows it down.
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            self.tree = _build_balanced(values, 0, len(values))
+        finally:
+            if enabled:
+                gc.enable()
+        self._size = len(values)
+
+    def _rebalance(self, path):
+        # Walks back up from the changed node, fixing heights and rotating.
+        for i in range(len(path) - 1, -1, -1):
+            node = path[i]
+            height = node.height
+            fixed = _avl_fix(node)
+            if fixed is node:
+                if node.height == height:
+                    return
+                continue
+            if i:
+                parent = path[i - 1]
+                if parent.left is node:
+                    parent.left = fixed
+                else:
+                    parent.right = fixed
+            else:
+                self.tree = fixed
 
 
 class BinaryNode(object):
     """
     A binary node object.
     """
+    __slots__ = ('data', 'left', 'right', 'height')
+
     def __init__(self, left, value, right):
         self.data, self.left, self.right = value, left, right
-        
-    def lookup(self, value):
-        if self.data == value:
-            return True
-        elif self.data > value:
-            return self.left.lookup(value)
-        else:
-            return self.right.lookup(value)
-        
-    def insert(self, value):
-        if self.data > value:
-            self.left = self.left.insert(value)
-        elif self.data < value:
-            self.right = self.right.insert(value)
-        return self
-    
-    def __repr__(self):
-        return f'<BinaryNode {self.left} {self.data} {self.right}>'
+        self.height = 1 + max(left.height if left is not None else 0, right.height if right is not None else 0)
 
-
-def KeyedBinaryTree(object):
-    def __init__(self):
-        self.tree = KeyedEmptyNode()
-        
     def __repr__(self):
-        return f'<KeyedBinaryTree {repr(self.tree)}>'
-    
-    def lookup(self, key):
-        return self.tree.lookup(key)
-    
-    def insert(self, key, value):
-        self.tree = self.tree.insert(key,value)
+        left = self.left if self.left is not None else '*'
+        right = self.right if self.right is not None else '*'
+        return f'<BinaryNode {left} {self.data} {right}>'
 
 
-class KeyedEmptyNode(object):
+def _avl_fix(node):
     """
-    A placeholder for KeyedBinaryNode()
+    Updates the height of node and rotates it if it is
+    out of balance. Returns the new root of the subtree.
     """
-    def __repr__(self):
-        return '*'
-    
-    def lookup(self, value):
-        return None
-    
-    def insert(self, key, value):
-        return KeyedBinaryNode(self, key, value, self)
+    left, right = node.left, node.right
+    lh = left.height if left is not None else 0
+    rh = right.height if right is not None else 0
 
+    if lh - rh > 1:
+        if (left.left.height if left.left is not None else 0) < (left.right.height if left.right is not None else 0):
+            node.left = _rotate_left(left)
+        return _rotate_right(node)
+    if rh - lh > 1:
+        if (right.right.height if right.right is not None else 0) < (right.left.height if right.left is not None else 0):
+            node.right = _rotate_right(right)
+        return _rotate_left(node)
 
-class KeyedBinaryNode(object):
-    def __init__(self, left, key, value, right):
-        self.val, self.key, self.left, self.right = value, key, left, right
-        
-    def lookup(self, key):
-        if self.key == key:
-            return self.val
-        elif self.key > key:
-            return self.left.lookup(key)
-        else:
-            return self.right.lookup(key)
-        
-    def insert(self, key, value):
-        if self.key == key:
-            self.val = value
-        elif self.key > key:
-            self.left = self.left.insert(key, value)
-        elif self.key > key:
-            self.right = self.right.insert(key, value)
-        return self
-    
-    def __repr__(self):
-        return f'<KeyedBinaryNode {self.left} {self.key} {self.data} {self.right}>'
+    node.height = 1 + (lh if lh > rh else rh)
+    return node
 
 
-class Graph(object):
-    """
-    An object for graph searching
-    """
-    def __init__(self, label, extra):
-        self.name = label
-        self.data = extra
-        self.arcs = []
-        
+def _update_height(node):
+    lh = node.left.height if node.left is not None else 0
+    rh = node.right.height if node.right is not None else 0
+    node.height = 1 + (lh if lh > rh else rh)
+
+
+def _rotate_left(node):
+    pivot = node.right
+    node.right = pivot.left
+    pivot.left = node
+    _update_height(node)
+    _update_height(pivot)
+    return pivot
+
+
+def _rotate_right(node):
+    pivot = node.left
+    node.left = pivot.right
+    pivot.right = node
+    _update_height(node)
+    _update_height(pivot)
+    return pivot
+
+
+def _build_balanced(values, lo, hi):
+    if lo >= hi:
+        return None
+    mid = (lo + hi) // 2
+    return BinaryNode(_build_balanced(values, lo, mid), values[mid], _build_balanced(values, mid + 1, hi))
+
+
+class KeyedBinaryTree(MutableMapping):
+    """
+    An ordered map.
+
+    Keys and values are kept in parallel sorted lists, split into
+    chunks of around a thousand keys with the largest key of each
+    chunk indexed, so lookups are two bisects (O(log n)) and there
+    is no per-node object overhead. Keys only need to be orderable.
+    """
+    _load = 1000
+
+    def __init__(self, other=(), **kwargs):
+        self._keys = []
+        self._values = []
+        self._maxes = []
+        self._size = 0
+        self.update(other, **kwargs)
+
     def __repr__(self):
-        return self.name
-    
-    def search(self, goal):
-        Graph.solns = []
-        self.generate([self], goal)
-        Graph.solns.sort(key=lambda x: len(x))
-        return Graph.solns
-    
-    def generate(self, path, goal):
-        if self == goal:
-            Graph.solns.append(path)
+        return '<KeyedBinaryTree {%s}>' % ', '.join(f'{key!r}: {value!r}' for key, value in self._iter_items(None, None))
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        for keys in self._keys:
+            yield from keys
+
+    def __contains__(self, key):
+        maxes = self._maxes
+        i = bisect.bisect_left(maxes, key)
+        if i == len(maxes):
+            return False
+        keys = self._keys[i]
+        return not key < keys[bisect.bisect_left(keys, key)]
+
+    def __getitem__(self, key):
+        maxes = self._maxes
+        i = bisect.bisect_left(maxes, key)
+        if i != len(maxes):
+            keys = self._keys[i]
+            j = bisect.bisect_left(keys, key)
+            if not key < keys[j]:
+                return self._values[i][j]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        maxes = self._maxes
+        if not maxes:
+            self._keys.append([key])
+            self._values.append([value])
+            maxes.append(key)
+            self._size = 1
+            return
+
+        i = bisect.bisect_left(maxes, key)
+        if i == len(maxes):
+            i -= 1
+            keys = self._keys[i]
+            keys.append(key)
+            self._values[i].append(value)
+            maxes[i] = key
         else:
-            for arc in self.arcs:
-                if arc not in path:
-                    arc.generate(path + [arc], goal)
+            keys = self._keys[i]
+            j = bisect.bisect_left(keys, key)
+            if not key < keys[j]:
+                self._values[i][j] = value
+                return
+            keys.insert(j, key)
+            self._values[i].insert(j, value)
+
+        self._size += 1
+        if len(keys) > 2 * self._load:
+            self._split(i)
+
+    def __delitem__(self, key):
+        maxes = self._maxes
+        i = bisect.bisect_left(maxes, key)
+        if i == len(maxes):
+            raise KeyError(key)
+        keys = self._keys[i]
+        j = bisect.bisect_left(keys, key)
+        if key < keys[j]:
+            raise KeyError(key)
+
+        del keys[j]
+        del self._values[i][j]
+        self._size -= 1
+
+        if not keys:
+            del self._keys[i], self._values[i], maxes[i]
+            return
+        if j == len(keys):
+            maxes[i] = keys[-1]
+        if len(keys) < self._load // 2 and len(maxes) > 1:
+            self._join(i if i + 1 < len(maxes) else i - 1)
+
+    def lookup(self, key):
+        """
+        Returns the value of key, or None if it is not in the tree.
+        """
+        return self.get(key)
+
+    def insert(self, key, value):
+        self[key] = value
+
+    def clear(self):
+        self._keys, self._values, self._maxes = [], [], []
+        self._size = 0
+
+    def floor(self, key):
+        """
+        Returns the (key, value) item with the largest
+        key <= key, or None if there is none.
+        """
+        maxes = self._maxes
+        i = bisect.bisect_right(maxes, key)
+        if i < len(maxes):
+            j = bisect.bisect_right(self._keys[i], key)
+            if j:
+                return self._keys[i][j - 1], self._values[i][j - 1]
+        if i:
+            return self._keys[i - 1][-1], self._values[i - 1][-1]
+        return None
+
+    def ceiling(self, key):
+        """
+        Returns the (key, value) item with the smallest
+        key >= key, or None if there is none.
+        """
+        i = bisect.bisect_left(self._maxes, key)
+        if i == len(self._maxes):
+            return None
+        j = bisect.bisect_left(self._keys[i], key)
+        return self._keys[i][j], self._values[i][j]
+
+    def items(self, lo=None, hi=None):
+        """
+        Without arguments this is dict.items(), otherwise it
+        yields the items with lo <= key < hi in order. Either
+        bound can be None to leave that side open.
+        """
+        if lo is None and hi is None:
+            return super().items()
+        return self._iter_items(lo, hi)
+
+    def update(self, other=(), **kwargs):
+        """
+        Like dict.update(). Large updates are sorted and merged
+        into the tree in one pass instead of inserted one by one.
+        """
+        if isinstance(other, Mapping):
+            other = other.items()
+        elif hasattr(other, 'keys'):
+            other = [(key, other[key]) for key in other.keys()]
+        items = list(other)
+        items.extend(kwargs.items())
+
+        if len(items) < 64 or len(items) < self._size // 8:
+            for key, value in items:
+                self[key] = value
+            return
+
+        # Stable sort, so the last of several equal keys wins.
+        items.sort(key=lambda item: item[0])
+        keys, values = [], []
+        old = self._iter_items(None, None)
+        current = next(old, None)
+        for key, value in items:
+            while current is not None and current[0] < key:
+                keys.append(current[0])
+                values.append(current[1])
+                current = next(old, None)
+            if current is not None and not key < current[0]:
+                current = next(old, None)
+            if keys and not keys[-1] < key:
+                values[-1] = value
+                continue
+            keys.append(key)
+            values.append(value)
+        while current is not None:
+            keys.append(current[0])
+            values.append(current[1])
+            current = next(old, None)
+
+        load = self._load
+        self._keys = [keys[i:i + load] for i in range(0, len(keys), load)]
+        self._values = [values[i:i + load] for i in range(0, len(values), load)]
+        self._maxes = [chunk[-1] for chunk in self._keys]
+        self._size = len(keys)
+
+    def _iter_items(self, lo, hi):
+        i = j = 0
+        if lo is not None:
+            i = bisect.bisect_left(self._maxes, lo)
+            if i == len(self._maxes):
+                return
+            j = bisect.bisect_left(self._keys[i], lo)
+        for keys, values in zip(self._keys[i:], self._values[i:]):
+            for k in range(j, len(keys)):
+                key = keys[k]
+                if hi is not None and not key < hi:
+                    return
+                yield key, values[k]
+            j = 0
+
+    def _split(self, i):
+        keys, values = self._keys[i], self._values[i]
+        half = len(keys) // 2
+        self._keys[i:i + 1] = [keys[:half], keys[half:]]
+        self._values[i:i + 1] = [values[:half], values[half:]]
+        self._maxes[i:i + 1] = [keys[half - 1], keys[-1]]
+
+    def _join(self, i):
+        self._keys[i].extend(self._keys.pop(i + 1))
+        self._values[i].extend(self._values.pop(i + 1))
+        del self._maxes[i]
+        if len(self._keys[i]) > 2 * self._load:
+            self._split(i)
+
+
+class Graph(object):
+    """
+    An object for graph searching
+
+    Every Graph is a node, its arcs list holds the nodes
+    it points to. Arcs added with add_arc() can carry a
+    weight, arcs without one weigh 1.
+    """
+    def __init__(self, label, extra=None):
+        self.name = label
+        self.data = extra
+        self.arcs = []
+        self.weights = {}
+
+    def __repr__(self):
+        return self.name
+
+    def add_arc(self, node, weight=1):
+        """
+        Adds an arc from this node to node, or changes its weight.
+        """
+        if node not in self.weights and node not in self.arcs:
+            self.arcs.append(node)
+        self.weights[node] = weight
+
+    def weight(self, node):
+        return self.weights.get(node, 1)
+
+    @staticmethod
+    def path_cost(path):
+        """
+        Returns the summed weight of the arcs of path.
+        """
+        return sum(path[i].weights.get(path[i + 1], 1) for i in range(len(path) - 1))
+
+    def search(self, goal, k=None):
+        """
+        Returns the paths to goal, fewest arcs first.
+
+        Without k only the shortest one is found (in a list, which
+        is empty if there is none), with it the first k paths.
+        """
+        if k is None:
+            path = self.bfs(goal)
+            return [] if path is None else [path]
+        return [path for _, path in zip(range(k), self.shortest_paths(goal, weighted=False))]
+
+    def bfs(self, goal):
+        """
+        Returns the path to goal with the fewest arcs, or None.
+        """
+        parents = {self: None}
+        queue = deque([self])
+        while queue:
+            node = queue.popleft()
+            if node is goal:
+                return _unwind(parents, node)
+            for arc in node.arcs:
+                if arc not in parents:
+                    parents[arc] = node
+                    queue.append(arc)
+        return None
+
+    def dijkstra(self, goal):
+        """
+        Returns the cheapest path to goal by arc weight, or None.
+        """
+        return _shortest_path(self, goal, None, True)[1]
+
+    def astar(self, goal, heuristic=None):
+        """
+        Returns the cheapest path to goal by arc weight, or None.
+
+        heuristic(node, goal) estimates the remaining cost from node,
+        it must never overestimate it or the path may not be the
+        cheapest. Without one this is the same as dijkstra().
+        """
+        return _shortest_path(self, goal, heuristic, True)[1]
+
+    def shortest_paths(self, goal, weighted=True):
+        """
+        Lazily yields the simple paths to goal, cheapest first
+        (Yen's k-shortest paths). If weighted is False every
+        arc costs 1.
+
+        The cost from every node to goal is worked out once, with
+        one Dijkstra over the reversed arcs, and steers every spur
+        search after that as an exact A* heuristic.
+        """
+        remaining = _costs_to(self, goal, weighted)
+        if self not in remaining:
+            return
+        heuristic = lambda node, goal: remaining.get(node, _INFINITY)
+        cost, path = _shortest_path(self, goal, heuristic, weighted)
+        found = [path]
+        seen = {tuple(path)}
+        candidates = []
+        counter = 0
+        yield path
+
+        while True:
+            previous = found[-1]
+            root_cost = 0
+            for i in range(len(previous) - 1):
+                spur = previous[i]
+                root = previous[:i + 1]
+                banned_arcs = set()
+                for other in found:
+                    if len(other) > i + 1 and other[:i + 1] == root:
+                        banned_arcs.add((other[i], other[i + 1]))
+                spur_cost, spur_path = _shortest_path(spur, goal, heuristic, weighted, set(root[:-1]), banned_arcs)
+                if spur_path is not None:
+                    candidate = root[:-1] + spur_path
+                    key = tuple(candidate)
+                    if key not in seen:
+                        seen.add(key)
+                        heapq.heappush(candidates, (root_cost + spur_cost, counter, candidate))
+                        counter += 1
+                root_cost += spur.weights.get(previous[i + 1], 1) if weighted else 1
+
+            if not candidates:
+                return
+            path = heapq.heappop(candidates)[2]
+            found.append(path)
+            yield path
+
+
+_INFINITY = float('inf')
+
+
+def _costs_to(start, goal, weighted):
+    """
+    Returns {node: cost of its cheapest path to goal} for the
+    nodes reachable from start that can reach goal.
+    """
+    reverse = {start: []}
+    stack = [start]
+    while stack:
+        node = stack.pop()
+        for arc in node.arcs:
+            if arc not in reverse:
+                reverse[arc] = []
+                stack.append(arc)
+            reverse[arc].append(node)
+    if goal not in reverse:
+        return {}
+
+    push, pop = heapq.heappush, heapq.heappop
+    costs = {goal: 0}
+    done = set()
+    heap = [(0, 0, goal)]
+    counter = 1
+    while heap:
+        cost, _, node = pop(heap)
+        if node in done:
+            continue
+        done.add(node)
+        for parent in reverse[node]:
+            new = cost + (parent.weights.get(node, 1) if weighted else 1)
+            if parent not in costs or new < costs[parent]:
+                costs[parent] = new
+                push(heap, (new, counter, parent))
+                counter += 1
+    return costs
+
+
+def _unwind(parents, node):
+    path = []
+    while node is not None:
+        path.append(node)
+        node = parents[node]
+    path.reverse()
+    return path
+
+
+def _shortest_path(start, goal, heuristic, weighted, banned_nodes=(), banned_arcs=()):
+    """
+    Dijkstra/A* from start to goal. Returns (cost, path), or (None, None).
+    """
+    push, pop = heapq.heappush, heapq.heappop
+    costs = {start: 0}
+    parents = {start: None}
+    done = set()
+    heap = [(heuristic(start, goal) if heuristic else 0, 0, start)]
+    counter = 1
+
+    while heap:
+        _, _, node = pop(heap)
+        if node in done:
+            continue
+        if node is goal:
+            return costs[node], _unwind(parents, node)
+        done.add(node)
+        cost = costs[node]
+        weights = node.weights
+        for arc in node.arcs:
+            if arc in done or arc in banned_nodes or (banned_arcs and (node, arc) in banned_arcs):
+                continue
+            new = cost + (weights.get(arc, 1) if weighted else 1)
+            if arc not in costs or new < costs[arc]:
+                estimate = new + heuristic(arc, goal) if heuristic else new
+                if estimate == _INFINITY:
+                    # The heuristic knows goal cannot be reached from arc.
+                    continue
+                costs[arc] = new
+                parents[arc] = node
+                push(heap, (estimate, counter, arc))
+                counter += 1
+    return None, None
+
+
+class Namespace(object):
+    """
+    The result of ArgumentParser.parse_args().
+
+    Every option and argument dest is an attribute (also
+    reachable as ns[dest]), anything that is not an option
+    ends up in the positionals list.
+    """
+    def __init__(self, **kwargs):
+        self.positionals = []
+        self.__dict__.update(kwargs)
+
+    def __getitem__(self, dest):
+        return self.__dict__[dest]
+
+    def __contains__(self, dest):
+        return dest in self.__dict__
+
+    def __eq__(self, other):
+        if not isinstance(other, Namespace):
+            return NotImplemented
+        return self.__dict__ == other.__dict__
+
+    def __repr__(self):
+        return '<Namespace %s>' % ' '.join(f'{key}={value!r}' for key, value in self.__dict__.items())
 
 
 class ArgumentParser(object):
@@ -947,10 +2899,13 @@ class ArgumentParser(object):
         self.arguments = []
         self.options = []
         self.help = []
+        self.subcommands = {}
+        self._table = None
+        self._help_text = None
 
     def __getitem__(self, i):
         try:
-            return self.all[i]
+            return self.args[i]
         except IndexError:
             return None
 
@@ -958,51 +2913,218 @@ class ArgumentParser(object):
         return len(self.args)
 
     def __repr__(self):
-        return '<ArgumentParser %s>' % (repr(self._args))
-
-    def add_argument(self, names: list, dest):
-        self.arguments.append([names, dest])
+        return '<ArgumentParser %s>' % (repr(self.args))
+
+    def add_argument(self, names: list, dest, count=False):
+        """
+        Adds a flag, its dest is True when one of names is given
+        (or the amount of times they were given if count is True).
+        """
+        self.arguments.append([names, dest, count])
+        self._table = None
         
-    def add_option(self, names: list, dest, type_=str, defaultval=None, required=False):
-        self.options.append([names, dest, type_, defaultval, required])
+    def add_option(self, names: list, dest, type_=str, defaultval=None, required=False, append=False):
+        """
+        Adds an option that takes a value, given as "--name value",
+        "--name=value" or "-nvalue". If append is True every value
+        given is collected in a list, otherwise the last one wins.
+        """
+        self.options.append([names, dest, type_, defaultval, required, append])
+        self._table = None
         
     def add_help(self, help_string, accept_dash_h=True, stdout=sys.stdout):
         self.help = [help_string, accept_dash_h, stdout]
-        
-    def parse_args(self):
-        out = {"opts": {}, "args": []}
-        
-        for opt in self.options:
-            for name in opt[0]:
-                if name in self.args:
-                    option = opt[2](sys.argv[sys.argv.index(name)+1])
-                    out["opts"][opt[1]] = option
-                elif '=' in name:
-                    tmp = name.split('=')
-                    if tmp[2] in self.args:
-                        out["opts"][opt[1]] = opt[3]
-                else:
-                    if opt[4] == True:
-                        out["opts"][opt[1]] = opt[3]
-                        
+        self._table = None
+        self._help_text = None
+
+    def add_subcommand(self, name, target, help='', usage=None):
+        """
+        Registers a subcommand without importing it.
+
+        target is the dotted path of the function to run, like
+        "mytool.commands.build:main" or "mytool.commands.build.main".
+        It is only imported when dispatch() runs the subcommand,
+        "tool name --help" prints usage and help without importing.
+        """
+        self.subcommands[name] = [target, help, usage or name]
+        self._help_text = None
+
+    def format_help(self):
+        """
+        Returns the help string with the subcommands listed
+        under it. It is built once and cached.
+        """
+        if self._help_text is None:
+            text = self.help[0] if self.help else ''
+            if self.subcommands:
+                width = max(len(name) for name in self.subcommands)
+                lines = [f'  {name:<{width}}  {sub[1]}'.rstrip() for name, sub in self.subcommands.items()]
+                if text and not text.endswith('\n'):
+                    text += '\n'
+                text += 'Commands:\n' + '\n'.join(lines) + '\n'
+            self._help_text = text
+        return self._help_text
+
+    def dispatch(self, args=None):
+        """
+        Parses args, imports the subcommand that was given and
+        calls it with the rest of the arguments (the subcommand
+        name first, like sys.argv). Returns what it returns.
+        """
+        if not self.subcommands:
+            raise CommandlineError("No subcommands were added!")
+        ns = self.parse_args(args)
+        if ns.subcommand is None:
+            raise CommandlineError("No command given!")
+
+        target, help_string, usage = self.subcommands[ns.subcommand]
+        for arg in ns.subargs:
+            if arg == '--':
+                break
+            if arg in ('-h', '--help'):
+                stdout = self.help[2] if self.help else sys.stdout
+                stdout.write(f'usage: {usage}\n' + (f'\n{help_string}\n' if help_string else ''))
+                stdout.flush()
+                sys.exit()
+
+        return _import_target(target)([ns.subcommand] + ns.subargs)
+
+    def _compile(self):
+        """
+        Builds the name -> spec table parse_args() uses.
+        """
+        table = {}
         for arg in self.arguments:
             for name in arg[0]:
-                if name in self.args:
-                    out["args"].append(arg[1])
-                
-        if self.help == []:
-            pass
-        else:
+                table[name] = ('flag', arg)
+        for opt in self.options:
+            for name in opt[0]:
+                table[name] = ('option', opt)
+        if self.help:
+            table['--help'] = ('help', self.help)
             if self.help[1]:
-                if '-h' in self.args or '--help' in self.args:
-                    self.help[2].write(self.help[0])
-                    self.help[2].flush()
-                    sys.exit()
+                table['-h'] = ('help', self.help)
+        self._table = table
+        return table
+
+    def parse_args(self, args=None):
+        """
+        Parses args (self.args without the program name by
+        default) in a single pass and returns a Namespace.
+        """
+        table = self._table
+        if table is None:
+            table = self._compile()
+        if args is None:
+            args = self.args[1:]
+
+        values = {}
+        positionals = []
+        subcommands = self.subcommands
+        subcommand, subargs = None, []
+        i, total = 0, len(args)
+        while i < total:
+            token = args[i]
+            i += 1
+
+            if token == '--':
+                positionals.extend(args[i:])
+                break
+            if len(token) < 2 or token[0] != '-':
+                if subcommands and not positionals and token in subcommands:
+                    subcommand, subargs = token, args[i:]
+                    break
+                positionals.append(token)
+                continue
+
+            name, eq, value = token.partition('=') if token[1] == '-' else (token, '', '')
+            found = table.get(name)
+            if found is not None:
+                if found[0] == 'flag' and eq:
+                    raise CommandlineError(f"Flag {name} does not take a value!")
+                if found[0] == 'option' and not eq:
+                    if i == total:
+                        raise CommandlineError(f"Option {name} needs a value!")
+                    value = args[i]
+                    i += 1
+                self._apply(found, name, value, values)
+                continue
+
+            if token[1] == '-':
+                positionals.append(token)
+                continue
+
+            # Bundled short flags, e.g. -xvf file or -ofile.
+            chars = token[1:]
+            specs = []
+            for j, char in enumerate(chars):
+                found = table.get('-' + char)
+                if found is None:
+                    specs = None
+                    break
+                if found[0] == 'option':
+                    value = chars[j + 1:]
+                    if not value:
+                        if i == total:
+                            raise CommandlineError(f"Option -{char} needs a value!")
+                        value = args[i]
+                        i += 1
+                    specs.append((found, '-' + char, value))
+                    break
+                specs.append((found, '-' + char, ''))
+            if specs is None:
+                positionals.append(token)
+                continue
+            for found, name, value in specs:
+                self._apply(found, name, value, values)
+
+        out = Namespace()
+        out.positionals = positionals
+        if subcommands:
+            out.subcommand, out.subargs = subcommand, subargs
+        for names, dest, count in self.arguments:
+            setattr(out, dest, values.get(dest, 0 if count else False))
+        for names, dest, type_, defaultval, required, append in self.options:
+            if dest in values:
+                setattr(out, dest, values[dest])
+            elif required:
+                raise CommandlineError(f"Option {names[0]} is required!")
+            else:
+                setattr(out, dest, [] if append and defaultval is None else defaultval)
+        return out
+
+    def _apply(self, found, name, value, values):
+        kind, spec = found
+        if kind == 'flag':
+            values[spec[1]] = values.get(spec[1], 0) + 1 if spec[2] else True
+        elif kind == 'option':
+            try:
+                value = spec[2](value)
+            except (TypeError, ValueError):
+                raise CommandlineError(f"Invalid value {value!r} for option {name}!") from None
+            if spec[5]:
+                values.setdefault(spec[1], []).append(value)
             else:
-                if '--help' in self.args:
-                    self.help[2].write(self.help[0])
-                    self.help[2].flush()
-                    sys.exit()
+                values[spec[1]] = value
+        else:
+            spec[2].write(self.format_help())
+            spec[2].flush()
+            sys.exit()
+
+
+def _import_target(target):
+    """
+    Imports and returns the object a "module:attr" or "module.attr" path names.
+    """
+    import importlib
+
+    module, sep, attr = target.partition(':')
+    if not sep:
+        module, _, attr = target.rpartition('.')
+    obj = importlib.import_module(module)
+    for part in attr.split('.'):
+        obj = getattr(obj, part)
+    return obj
 
 
 def encode_str(string):
@@ -1014,170 +3136,1652 @@ def encode_str(string):
         return str(string).encode(sys.getfilesystemencoding())
 
 
-class DevNull(object):
+class DevNull(io.TextIOBase):
     """
     This class is essentially a trash bin class. You
     can use it as a substitute for most i/o streams.
+
+    Writes are thrown away without touching the os and
+    reads hit end of file straight away. A real fd on the
+    null device is only opened (once) if fileno() is called.
+    Like any closed stream it raises ValueError on write()
+    and fileno() after close(); the other methods keep working.
     """
+    encoding = 'utf-8'
+    errors = 'strict'
+
     def __init__(self):
-        if sys.platform in ['dos','win16']:
-            self.nullfp = r'C:\DEV\NUL'
-        elif sys.platform in ['win32','win64']:
-            self.nullfp = r'C:\\Device\Null'
-        else:
-            self.nullfp = '/dev/null'
+        self.nullfp = os.devnull
+        self._fd = None
 
-    def __enter__(self):
-        self.__init__()
+    # Writing only has to report how much was "written", so the
+    # builtin does it without an interpreted frame per call.
+    write = staticmethod(len)
+
+    def writelines(self, lines):
+        for _ in lines:
+            pass
+
+    def read(self, size=-1):
+        return ''
+
+    def readall(self):
+        return ''
+
+    def readinto(self, buffer):
+        return 0
+
+    def readline(self, size=-1):
+        return ''
+
+    def readlines(self, hint=-1):
+        return []
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=0):
+        return 0
+
+    def tell(self):
+        return 0
+
+    def truncate(self, size=None):
+        return 0
 
-    def __exit__(self):
-        self.close()
-    
     def isatty(self):
         return False
 
-    def write(self,data):
-        if type(data) == str:
-            with open(self.nullfp,'w') as fd:
-                fd.write(pickle.dumps(data))
-        else:
-            with open(self.nullfp,'wb') as fd:
-                fd.write(pickle.dumps(data))
-                
-    def read(self,bytenum):
-        return ''
-    
-    def readlines(self,linenums):
-        return ['']
-    
+    def flush(self):
+        pass
+
+    @property
+    def buffer(self):
+        return self
+
     def fileno(self):
-        return open(self.nullfp,'rb').fileno()
-    
+        if self.closed:
+            raise ValueError("I/O operation on closed DevNull!")
+        if self._fd is None:
+            self._fd = os.open(self.nullfp, os.O_RDWR)
+        return self._fd
+
     def close(self):
-        pass
-    
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        # Shadows the class level len() on this instance only.
+        self.write = self._write_closed
+        super().close()
+
+    def _write_closed(self, text):
+        raise ValueError("I/O operation on closed DevNull!")
+
     def __str__(self):
         return self.nullfp
     
     def __repr__(self):
         return "<DevNull>"
-    
-    def flush(self):
-        with open(self.nullfp,'w') as fd:
-            fd.flush()
 
 
-def glob(root, pattern):
+def glob(root, pattern='*', exclude=(), prune=(), threads=None, dirs=False, entries=False):
     """
-    Works just like glob.glob()
+    Works just like glob.glob(), but walks the whole tree under root.
+
+     pattern - A pattern or a list of them. Patterns without a "/"
+               match file names anywhere under root, others match the
+               path relative to root, where "**" matches any amount
+               of directories.
+     exclude - Patterns of files to leave out. Excluding "dir/**"
+               skips that directory entirely.
+     prune - Patterns of directories not to descend into.
+     threads - Scan directories in a pool of this many threads,
+               results then come in no particular order.
+     dirs - Also yield matching directories.
+     entries - Yield os.DirEntry objects instead of paths, their
+               stat() results are cached.
+
+    Directories no pattern can match anything in are never read.
     """
     if root is None:
         return
-    
-    if os.path.isfile(root) and fnmatch.fnmatch(root, pattern):
-        yield root
+
+    if os.path.isfile(root):
+        import fnmatch
+
+        patterns = [pattern] if isinstance(pattern, str) else pattern
+        if any(fnmatch.fnmatch(root, p) for p in patterns):
+            yield root
         return
-    
-    for base, dirs, files in os.walk(root):
-        matches = fnmatch.filter(files, pattern)
-        for filename in matches:
-            yield os.path.join(base, filename)
-
-
-# def execute(cmd, verbose=False):
-#     """
-#     Executes shell command.
-#     """
-#     p = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-#     out = []
-#     while 1:
-#         line = p.stdout.readline()
-#         out.append(line)
-#         if verbose:
-#             print(line)
-#         if not line and p.poll() is not None:
-#             break
-#     if p.returncode != 0:
-#         print(p.stderr.read().strip())
-#         return 1
-#     else:
-#         return ''.join(out).strip()
-
-
-# def daemonize():
-#     """
-#     Daemonizes the current process.
-#     """
-#     if os.fork():
-#         os._exit(0)
-#     os.chdir('/')
-#     os.umask(22)
-#     os.setsid()
-#     os.umask(0)
-#     if os.fork():
-#         os._exit(0)
-#     stdin = open(os.devnull)
-#     stdout = open(os.devnull, 'w')
-#     os.dup2(stdin.fileno(), 0)
-#     os.dup2(stdout.fileno(), 1)
-#     os.dup2(stdout.fileno(), 2)
-#     stdin.close()
-#     stdout.close()
-#     os.umask(22)
-#     for fd in range(3, 1024):
-#         try:
-#             os.close(fd)
-#         except OSError:
-#             pass
-#     return os.getpid()
+
+    matcher = _GlobMatcher(pattern, exclude, prune, dirs)
+    scan = matcher.scan
+    if not threads:
+        for entry in _glob_walk(matcher, root, '', matcher.start):
+            yield entry if entries else entry.path
+        return
+
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+    pool = ThreadPoolExecutor(threads)
+    pending = set()
+    try:
+        pending.add(pool.submit(scan, root, '', matcher.start))
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                matches, subdirs = future.result()
+                for subdir in subdirs:
+                    pending.add(pool.submit(scan, *subdir))
+                for entry in matches:
+                    yield entry if entries else entry.path
+    finally:
+        # shutdown(cancel_futures=True) is Python 3.9+.
+        for future in pending:
+            future.cancel()
+        pool.shutdown(wait=False)
+
+
+def _glob_walk(matcher, path, rel, states):
+    """
+    Yields the matching entries under path, one directory at a time.
+    """
+    scan = matcher.scan
+    stack = [(path, rel, states)]
+    while stack:
+        matches, subdirs = scan(*stack.pop())
+        if matches:
+            yield from matches
+        subdirs.reverse()
+        stack.extend(subdirs)
+
+
+def _glob_translate(pattern):
+    """
+    Translates a glob pattern to a regex. Unlike fnmatch,
+    "*" and "?" stop at "/" and "**/" matches any amount
+    of directories.
+    """
+    import re
+
+    out = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        at_segment = i == 0 or pattern[i - 1] == '/'
+        if at_segment and pattern.startswith('**/', i):
+            out.append('(?:.*/)?')
+            i += 3
+            continue
+        if at_segment and i + 2 == n and pattern.endswith('**'):
+            out.append('.*')
+            i += 2
+            continue
+        if c == '*':
+            out.append('[^/]*')
+        elif c == '?':
+            out.append('[^/]')
+        elif c == '[':
+            j = i + 1
+            if j < n and pattern[j] == '!':
+                j += 1
+            if j < n and pattern[j] == ']':
+                j += 1
+            while j < n and pattern[j] != ']':
+                j += 1
+            if j >= n:
+                out.append('\\[')
+            else:
+                # Escaped the way fnmatch.translate() does it.
+                chars = pattern[i + 1:j]
+                if '-' not in chars:
+                    chars = chars.replace('\\', '\\\\')
+                else:
+                    chunks = []
+                    start = i + 1
+                    k = start + 2 if pattern[start] == '!' else start + 1
+                    while True:
+                        k = pattern.find('-', k, j)
+                        if k < 0:
+                            break
+                        chunks.append(pattern[start:k])
+                        start = k + 1
+                        k += 3
+                    chunk = pattern[start:j]
+                    if chunk:
+                        chunks.append(chunk)
+                    else:
+                        chunks[-1] += '-'
+                    # Drop empty ranges, e.g. "z-a".
+                    for k in range(len(chunks) - 1, 0, -1):
+                        if chunks[k - 1][-1] > chunks[k][0]:
+                            chunks[k - 1] = chunks[k - 1][:-1] + chunks[k][1:]
+                            del chunks[k]
+                    chars = '-'.join(chunk.replace('\\', '\\\\').replace('-', '\\-') for chunk in chunks)
+                # Set operations (&&, ~~ and ||) may get a meaning.
+                chars = re.sub(r'([&~|])', r'\\\1', chars)
+                if not chars:
+                    out.append('(?!)')
+                elif chars == '!':
+                    out.append('[^/]')
+                else:
+                    if chars[0] == '!':
+                        chars = '^' + chars[1:]
+                    elif chars[0] in ('^', '['):
+                        chars = '\\' + chars
+                    out.append(f'[{chars}]')
+                i = j
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return ''.join(out)
+
+
+class _GlobMatcher(object):
+    """
+    The compiled patterns of one glob() call.
+    """
+    def __init__(self, pattern, exclude, prune, dirs):
+        import re
+
+        def normalize(patterns):
+            if isinstance(patterns, str):
+                patterns = [patterns]
+            return [p.strip('/') if '/' in p.strip('/') else '**/' + p.strip('/') for p in patterns]
+
+        def compile_any(patterns):
+            # Patterns that only look at the file name are matched against
+            # the name, the others against the path relative to root.
+            names = [p[3:] for p in patterns if p.startswith('**/') and '/' not in p[3:]]
+            paths = [p for p in patterns if not (p.startswith('**/') and '/' not in p[3:])]
+            return tuple(
+                re.compile('|'.join(f'(?:{_glob_translate(p)})' for p in group), re.DOTALL).fullmatch if group else None
+                for group in (names, paths)
+            )
+
+        include = normalize(pattern)
+        exclude = normalize(exclude)
+        prune = normalize(prune) + [p[:-3] for p in exclude if p.endswith('/**')]
+
+        self.dirs = dirs
+        self.include_name, self.include_path = compile_any(include)
+        self.exclude_name, self.exclude_path = compile_any(exclude)
+        self.prune_name, self.prune_path = compile_any(prune)
+        self.needs_path = bool(self.include_path or self.exclude_path or self.prune_path)
+
+        # Pattern segments for deciding whether a directory is worth
+        # reading. A pattern that matches file names anywhere needs
+        # every directory, so no state has to be tracked at all.
+        if any(p.startswith('**/') and '/' not in p[3:] for p in include):
+            self.segments = None
+            self.start = None
+        else:
+            self.segments = [
+                [None if seg == '**' else re.compile(_glob_translate(seg), re.DOTALL).fullmatch for seg in p.split('/')]
+                for p in include
+            ]
+            self.start = tuple(frozenset([0]) for _ in include)
+
+    def descend(self, states, name):
+        """
+        Returns the states inside directory name, or None
+        if nothing in it can match.
+        """
+        new_states = []
+        alive = False
+        for segments, indices in zip(self.segments, states):
+            closure = set(indices)
+            for i in sorted(indices):
+                while i < len(segments) and segments[i] is None:
+                    i += 1
+                    closure.add(i)
+            new = set()
+            last = len(segments) - 1
+            for i in closure:
+                if i > last:
+                    continue
+                if segments[i] is None:
+                    new.add(i)
+                elif i < last and segments[i](name):
+                    new.add(i + 1)
+            alive = alive or bool(new)
+            new_states.append(frozenset(new))
+        return tuple(new_states) if alive else None
+
+    def match(self, name, relpath):
+        """
+        Returns true if the entry at relpath should be yielded.
+        """
+        if not ((self.include_name and self.include_name(name)) or (self.include_path and self.include_path(relpath))):
+            return False
+        return not ((self.exclude_name and self.exclude_name(name)) or (self.exclude_path and self.exclude_path(relpath)))
+
+    def enter(self, name, relpath, states):
+        """
+        Returns the states inside the directory at relpath,
+        or False if it does not need to be read.
+        """
+        if (self.prune_name and self.prune_name(name)) or (self.prune_path and self.prune_path(relpath)):
+            return False
+        if states is None:
+            return None
+        substates = self.descend(states, name)
+        return False if substates is None else substates
+
+    def scan(self, path, rel, states):
+        """
+        Reads one directory, returns its matching entries and
+        the (path, rel, states) of the directories to read next.
+        """
+        matches, subdirs = [], []
+        include_name, include_path = self.include_name, self.include_path
+        exclude_name, exclude_path = self.exclude_name, self.exclude_path
+        needs_path = self.needs_path
+        relpath = None
+        try:
+            it = os.scandir(path)
+        except OSError:
+            return matches, subdirs
+
+        with it:
+            for entry in it:
+                name = entry.name
+                if needs_path:
+                    relpath = rel + name
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+
+                if not is_dir or self.dirs:
+                    if ((include_name and include_name(name)) or (include_path and include_path(relpath))) \
+                            and not ((exclude_name and exclude_name(name)) or (exclude_path and exclude_path(relpath))):
+                        matches.append(entry)
+                    if not is_dir:
+                        continue
+
+                if entry.is_symlink() or (self.prune_name and self.prune_name(name)) or (self.prune_path and self.prune_path(relpath)):
+                    continue
+                if states is None:
+                    subdirs.append((entry.path, rel + name + '/', None))
+                else:
+                    substates = self.descend(states, name)
+                    if substates is not None:
+                        subdirs.append((entry.path, rel + name + '/', substates))
+        return matches, subdirs
+
+
+class GlobIndex(object):
+    """
+    An on-disk (sqlite) index of the files under root, so that
+    repeated glob() calls over a big tree do not walk it again.
+
+    refresh() records the path, mtime and size of every file and
+    the mtime of every directory. Later refreshes only read the
+    directories whose mtime changed. glob() answers from the
+    index, but checks the directory mtimes first and walks the
+    directories that changed since the last refresh live.
+
+    A file that changes in place does not touch its directory's
+    mtime, so its recorded mtime and size can be out of date
+    until that directory changes.
+
+     root - The directory to index
+     path - Where to keep the index, by default a file under
+            $XDG_CACHE_HOME/club (":memory:" for no file at all)
+    """
+    def __init__(self, root, path=None):
+        self.root = root
+        if path is None:
+            import hashlib
+
+            cache = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+            digest = hashlib.sha1(os.path.abspath(root).encode(sys.getfilesystemencoding(), 'surrogateescape')).hexdigest()
+            path = os.path.join(cache, 'club', f'globindex-{digest}.sqlite')
+        self.path = path
+        self._db = None
+
+    def __repr__(self):
+        return f'<GlobIndex {self.root!r} at {self.path!r}>'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _connect(self):
+        if self._db is None:
+            import sqlite3
+
+            if self.path != ':memory:':
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            db = sqlite3.connect(self.path)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.execute('CREATE TABLE IF NOT EXISTS dirs (rel TEXT PRIMARY KEY, parent TEXT, mtime_ns INTEGER)')
+            db.execute('CREATE TABLE IF NOT EXISTS files (dir TEXT, name TEXT, mtime_ns INTEGER, size INTEGER, PRIMARY KEY (dir, name)) WITHOUT ROWID')
+            self._db = db
+        return self._db
+
+    def _tree(self):
+        """
+        Returns {rel: mtime_ns} and {rel: [child rel, ...]} of the indexed directories.
+        """
+        mtimes, children = {}, {}
+        for rel, parent, mtime in self._connect().execute('SELECT rel, parent, mtime_ns FROM dirs'):
+            mtimes[rel] = mtime
+            if parent is not None:
+                children.setdefault(parent, []).append(rel)
+        return mtimes, children
+
+    def refresh(self):
+        """
+        Brings the index up to date, reading only the directories
+        that are new or whose mtime changed. Returns the amount
+        of directories that were read.
+        """
+        db = self._connect()
+        mtimes, children = self._tree()
+        seen = set()
+        scanned = 0
+        # Directories changed this recently may change again within the
+        # same mtime tick, they are marked to be read again next time.
+        recent = int(time.time() * 1e9) - 2 * 10 ** 9
+
+        with db:
+            stack = [('', None)]
+            while stack:
+                rel, parent = stack.pop()
+                try:
+                    mtime = os.stat(os.path.join(self.root, rel) if rel else self.root).st_mtime_ns
+                except OSError:
+                    continue
+                seen.add(rel)
+                if mtimes.get(rel) == mtime:
+                    stack.extend((child, rel) for child in children.get(rel, ()))
+                    continue
+
+                files, subdirs = [], []
+                try:
+                    with os.scandir(os.path.join(self.root, rel) if rel else self.root) as it:
+                        for entry in it:
+                            try:
+                                if entry.is_dir():
+                                    if not entry.is_symlink():
+                                        subdirs.append(rel + entry.name + '/')
+                                    continue
+                                try:
+                                    st = entry.stat()
+                                except OSError:
+                                    # A dangling symlink, glob() still yields it.
+                                    st = entry.stat(follow_symlinks=False)
+                            except OSError:
+                                continue
+                            files.append((rel, entry.name, st.st_mtime_ns, st.st_size))
+                except OSError:
+                    seen.discard(rel)
+                    continue
+
+                scanned += 1
+                db.execute('DELETE FROM files WHERE dir = ?', (rel,))
+                db.executemany('INSERT INTO files VALUES (?, ?, ?, ?)', files)
+                db.execute('INSERT OR REPLACE INTO dirs VALUES (?, ?, ?)', (rel, parent, -1 if mtime > recent else mtime))
+                stack.extend((subdir, rel) for subdir in subdirs)
+
+            gone = [(rel,) for rel in mtimes if rel not in seen]
+            db.executemany('DELETE FROM files WHERE dir = ?', gone)
+            db.executemany('DELETE FROM dirs WHERE rel = ?', gone)
+        return scanned
+
+    def glob(self, pattern='*', exclude=(), prune=(), check=True):
+        """
+        Works like club.glob(self.root, ...), but answers from the index.
+
+        Unless check is False every indexed directory is stat()ed
+        first, and the ones that changed since the last refresh
+        are walked live instead. An empty index is built first.
+        """
+        mtimes, children = self._tree()
+        if '' not in mtimes:
+            self.refresh()
+            mtimes, children = self._tree()
+
+        db = self._connect()
+        root = self.root
+        matcher = _GlobMatcher(pattern, exclude, prune, False)
+        stack = [('', matcher.start)]
+        while stack:
+            rel, states = stack.pop()
+            path = os.path.join(root, rel[:-1]) if rel else root
+            # A directory that could not be read at the last refresh
+            # is not in the index, it is walked live.
+            if check or rel not in mtimes:
+                try:
+                    dirty = os.stat(path).st_mtime_ns != mtimes.get(rel)
+                except OSError:
+                    continue
+                if dirty:
+                    for entry in _glob_walk(matcher, path, rel, states):
+                        yield entry.path
+                    continue
+
+            for (name,) in db.execute('SELECT name FROM files WHERE dir = ?', (rel,)):
+                if matcher.match(name, rel + name):
+                    yield os.path.join(path, name)
+            for child in children.get(rel, ()):
+                substates = matcher.enter(child[len(rel):-1], child[:-1], states)
+                if substates is not False:
+                    stack.append((child, substates))
+
+    def stat(self, relpath):
+        """
+        Returns the recorded (mtime_ns, size) of the file at
+        relpath (relative to root), or None.
+        """
+        rel, _, name = relpath.rpartition('/')
+        return self._connect().execute(
+            'SELECT mtime_ns, size FROM files WHERE dir = ? AND name = ?', (rel + '/' if rel else '', name)
+        ).fetchone()
+
+
+class CommandResult(object):
+    """
+    What execute() returns.
+
+     command - The command that ran
+     returncode - Its exit code (negative when killed by a signal,
+                  127 or 126 when it could not be started)
+     stdout, stderr - What it printed (None when not captured)
+     started - When it started, as a time.time()
+     elapsed - How long it ran, in seconds
+     timed_out - Whether it was killed for running too long
+    """
+    __slots__ = ('command', 'returncode', 'stdout', 'stderr', 'started', 'elapsed', 'timed_out')
+
+    def __init__(self, command, returncode, stdout, stderr, started, elapsed, timed_out=False):
+        self.command = command
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.started = started
+        self.elapsed = elapsed
+        self.timed_out = timed_out
+
+    def __repr__(self):
+        return f'<CommandResult {self.command!r} returncode={self.returncode} elapsed={self.elapsed:.3f}{" timed out" if self.timed_out else ""}>'
+
+    @property
+    def ok(self):
+        return self.returncode == 0 and not self.timed_out
+
+
+async def _pump(reader, chunks, callback):
+    """
+    Reads a pipe to its end, keeping the chunks and handing every
+    line to callback (which may be a coroutine function).
+    """
+    import inspect
+
+    rest = b''
+    while True:
+        data = await reader.read(65536)
+        if not data:
+            break
+        if chunks is not None:
+            chunks.append(data)
+        if callback is not None:
+            lines = (rest + data).split(b'\n')
+            rest = lines.pop()
+            for line in lines:
+                result = callback(line.decode('utf-8', 'replace'))
+                if inspect.isawaitable(result):
+                    await result
+    if callback is not None and rest:
+        result = callback(rest.decode('utf-8', 'replace'))
+        if inspect.isawaitable(result):
+            await result
+
+
+@functools.lru_cache(maxsize=None)
+def _command_protocol():
+    """
+    Builds the protocol execute_async() runs commands with (once,
+    asyncio is only imported when needed). It is asyncio's own,
+    which also resolves exited as soon as the command itself
+    exits: Process.wait() (before Python 3.12) waits for its
+    pipes to close as well, which whatever the command left in
+    the background can hold open.
+    """
+    import asyncio
+
+    class CommandProtocol(asyncio.subprocess.SubprocessStreamProtocol):
+        def __init__(self, loop):
+            super().__init__(limit=2 ** 16, loop=loop)
+            self.exited = loop.create_future()
+
+        def process_exited(self):
+            super().process_exited()
+            if not self.exited.done():
+                self.exited.set_result(time.monotonic())
+
+    return CommandProtocol
+
+
+async def execute_async(cmd, timeout=None, on_stdout=None, on_stderr=None, capture=True, cwd=None, env=None):
+    """
+    Runs a command (a string goes through /bin/sh, a list is run
+    as it is) and returns a CommandResult. stdout and stderr are
+    read at the same time, so neither can fill up and block it.
+    Without a timeout, like subprocess.run(), it returns once the
+    command has exited and its output has ended.
+
+     timeout - Run the command in a session of its own and kill
+               it if it is not done after this many seconds.
+               Whatever it leaves running is killed as soon as
+               it exits
+     on_stdout, on_stderr - Called with every line as it comes
+     capture - Keep the output in the result
+    """
+    import asyncio
+    import signal
+
+    argv = ['/bin/sh', '-c', cmd] if isinstance(cmd, str) else list(cmd)
+    loop = asyncio.get_event_loop()
+    started = time.time()
+    begin = time.monotonic()
+    protocol_factory = _command_protocol()
+    try:
+        transport, protocol = await loop.subprocess_exec(
+            lambda: protocol_factory(loop), *argv, stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, cwd=cwd, env=env,
+            start_new_session=timeout is not None
+        )
+    except OSError as error:
+        return CommandResult(cmd, 127 if isinstance(error, FileNotFoundError) else 126, '' if capture else None,
+                             str(error) if capture else None, started, time.monotonic() - begin)
+    process = asyncio.subprocess.Process(transport, protocol, loop)
+
+    def kill():
+        # With a timeout the command leads a session of its own,
+        # which takes whatever it started along.
+        try:
+            if timeout is not None:
+                os.killpg(process.pid, signal.SIGKILL)
+            elif process.returncode is None:
+                process.kill()
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    stdout = [] if capture else None
+    stderr = [] if capture else None
+    pumps = asyncio.gather(_pump(process.stdout, stdout, on_stdout), _pump(process.stderr, stderr, on_stderr))
+    timed_out = False
+    done = False
+    try:
+        if timeout is None:
+            await pumps
+        else:
+            try:
+                await asyncio.wait_for(asyncio.shield(protocol.exited), timeout)
+            except asyncio.TimeoutError:
+                timed_out = True
+            kill()
+            # Only something that left the session can still hold
+            # the pipes: it gets what is left of the timeout (a
+            # moment to read what is in them, if none is), then the
+            # pipes are closed.
+            try:
+                await asyncio.wait_for(asyncio.shield(pumps), max(begin + timeout - time.monotonic(), 0.1))
+            except asyncio.TimeoutError:
+                transport.close()
+                await pumps
+        await process.wait()
+        done = True
+    finally:
+        if not done:
+            kill()
+            pumps.cancel()
+            transport.close()
+
+    return CommandResult(
+        cmd, process.returncode,
+        b''.join(stdout).decode('utf-8', 'replace') if capture else None,
+        b''.join(stderr).decode('utf-8', 'replace') if capture else None,
+        started, protocol.exited.result() - begin, timed_out
+    )
+
+
+async def execute_many_async(cmds, limit=16, timeout=None, on_stdout=None, on_stderr=None, capture=True, cwd=None, env=None):
+    """
+    Runs commands, at most limit at the same time, and returns
+    their CommandResults in the same order. on_stdout and
+    on_stderr are called with the index of the command and the
+    line.
+    """
+    import asyncio
+
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(index, cmd):
+        async with semaphore:
+            return await execute_async(
+                cmd, timeout,
+                None if on_stdout is None else functools.partial(on_stdout, index),
+                None if on_stderr is None else functools.partial(on_stderr, index),
+                capture, cwd, env
+            )
+
+    return list(await asyncio.gather(*(run(index, cmd) for index, cmd in enumerate(cmds))))
+
+
+class CommandStream(object):
+    """
+    Runs a command and iterates over its output as it comes:
+
+        async for name, line in CommandStream('make'):
+            ...
+
+    name is 'stdout' or 'stderr'. Once the iteration is over
+    result holds the CommandResult. Takes the same options as
+    execute_async().
+    """
+    def __init__(self, cmd, **kwargs):
+        self.cmd = cmd
+        self.kwargs = kwargs
+        self.result = None
+        self._lines = None
+        self._task = None
+
+    def __aiter__(self):
+        import asyncio
+
+        lines = self._lines = asyncio.Queue()
+        self._task = asyncio.ensure_future(execute_async(
+            self.cmd, on_stdout=lambda line: lines.put_nowait(('stdout', line)),
+            on_stderr=lambda line: lines.put_nowait(('stderr', line)), **self.kwargs
+        ))
+        self._task.add_done_callback(lambda task: lines.put_nowait(None))
+        return self
+
+    async def __anext__(self):
+        item = await self._lines.get()
+        if item is None:
+            self.result = self._task.result()
+            raise StopAsyncIteration
+        return item
+
+
+def _run_async(coroutine):
+    """
+    Runs coroutine on an event loop of its own, like asyncio.run()
+    (which is Python 3.7+).
+    """
+    import asyncio
+
+    loop = asyncio.new_event_loop()
+    try:
+        # The child watcher that reaps the commands is attached to
+        # the current event loop.
+        asyncio.set_event_loop(loop)
+        return loop.run_until_complete(coroutine)
+    finally:
+        try:
+            loop.run_until_complete(loop.shutdown_asyncgens())
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+
+def execute(cmd, verbose=False, timeout=None, on_stdout=None, on_stderr=None, capture=True, cwd=None, env=None):
+    """
+    Executes shell command, see execute_async(). With verbose the
+    output is echoed as it comes.
+    """
+    if verbose:
+        on_stdout = on_stdout or (lambda line: print(line))
+        on_stderr = on_stderr or (lambda line: print(line, file=sys.stderr))
+    return _run_async(execute_async(cmd, timeout, on_stdout, on_stderr, capture, cwd, env))
+
+
+def execute_many(cmds, limit=16, timeout=None, on_stdout=None, on_stderr=None, capture=True, cwd=None, env=None):
+    """
+    Executes shell commands in parallel, see execute_many_async().
+    """
+    return _run_async(execute_many_async(cmds, limit, timeout, on_stdout, on_stderr, capture, cwd, env))
+
+
+def daemonize(keep_fds=()):
+    """
+    Daemonizes the current process: forks twice, detaches from
+    the terminal, points stdin, stdout and stderr at /dev/null
+    and closes every other fd but keep_fds. Returns the pid of
+    the daemon.
+    """
+    sys.stdout.flush()
+    sys.stderr.flush()
+    if os.fork():
+        os._exit(0)
+    os.setsid()
+    if os.fork():
+        os._exit(0)
+    os.chdir('/')
+    os.umask(0o22)
+
+    null = os.open(os.devnull, os.O_RDWR)
+    for fd in range(3):
+        os.dup2(null, fd)
+    # closerange() uses close_range() where the kernel has it.
+    start = 3
+    for fd in sorted(set(keep_fds)):
+        if fd >= start:
+            os.closerange(start, fd)
+            start = fd + 1
+    os.closerange(start, os.sysconf('SC_OPEN_MAX'))
+    return os.getpid()
+
+
+class Supervisor(object):
+    """
+    Preforks workers and keeps them running:
+
+        def echo(server):
+            while True:
+                client, _ = server.accept()
+                ...
+
+        Supervisor(echo, address=('0.0.0.0', 7000)).run()
+
+    Every worker calls target(*args), with the listening socket in
+    front when address is given, so the workers share it (a
+    multiprocessing queue in args works the same way). A worker
+    that exits is started again, after a growing delay if it keeps
+    dying within min_uptime seconds. SIGHUP, SIGUSR1 and SIGUSR2
+    are passed on to the workers, SIGTERM and SIGINT stop them
+    (SIGKILL after stop_timeout seconds) and end run().
+
+     workers - How many workers to run (one per CPU by default)
+     backoff - The first restart delay, doubled per crash
+     max_backoff - The longest restart delay
+    """
+    def __init__(self, target, workers=None, address=None, args=(), backlog=128,
+                 min_uptime=1.0, backoff=0.1, max_backoff=30.0, stop_timeout=10.0):
+        self.target = target
+        self.workers = workers or os.cpu_count() or 1
+        self.args = tuple(args)
+        self.min_uptime = min_uptime
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.stop_timeout = stop_timeout
+        self.socket = None
+        if address is not None:
+            import socket
+
+            # Not socket.create_server(), which is Python 3.8+.
+            family = socket.AF_INET6 if ':' in address[0] else socket.AF_INET
+            self.socket = socket.socket(family, socket.SOCK_STREAM)
+            try:
+                self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                self.socket.bind(address)
+                self.socket.listen(backlog)
+            except OSError:
+                self.socket.close()
+                raise
+            self.args = (self.socket,) + self.args
+        self.restarts = 0
+        self._pids = {}
+        self._started = {}
+        self._failures = {}
+        self._pending = {}
+        self._signals = deque()
+        self._stopping = False
+        self._pipe = None
+
+    def __repr__(self):
+        return f'<Supervisor {getattr(self.target, "__name__", self.target)!r} workers={self.workers}>'
+
+    def _on_signal(self, signum, frame):
+        self._signals.append(signum)
+
+    def stop(self):
+        """
+        Makes run() stop the workers and return.
+        """
+        self._stopping = True
+        if self._pipe is not None:
+            os.write(self._pipe[1], b'\0')
+
+    def _spawn(self, slot, handled):
+        import signal
+
+        pid = os.fork()
+        if pid:
+            self._pids[pid] = slot
+            self._started[slot] = time.monotonic()
+            return
+
+        # The worker: default signal handling and none of our fds.
+        code = 1
+        try:
+            signal.set_wakeup_fd(-1)
+            for signum in handled:
+                signal.signal(signum, signal.SIG_DFL)
+            for fd in self._pipe:
+                os.close(fd)
+            self.target(*self.args)
+            code = 0
+        except SystemExit as error:
+            code = error.code if isinstance(error.code, int) else int(error.code is not None)
+        except BaseException:
+            import traceback
+
+            traceback.print_exc()
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+
+    def _collect(self):
+        """
+        Waits for the workers that exited and schedules them to be
+        started again.
+        """
+        now = time.monotonic()
+        while self._pids:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if not pid:
+                break
+            slot = self._pids.pop(pid, None)
+            if slot is None or self._stopping:
+                continue
+            if now - self._started[slot] < self.min_uptime:
+                self._failures[slot] = self._failures.get(slot, 0) + 1
+            else:
+                self._failures[slot] = 0
+            failures = self._failures[slot]
+            delay = min(self.backoff * 2 ** (failures - 1), self.max_backoff) if failures else 0
+            self._pending[slot] = now + delay
+
+    def _forward(self, signum):
+        for pid in self._pids:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def _shutdown(self):
+        import signal
+
+        self._forward(signal.SIGTERM)
+        deadline = time.monotonic() + self.stop_timeout
+        delay = 0.001
+        while self._pids and time.monotonic() < deadline:
+            self._collect()
+            time.sleep(delay)
+            delay = min(delay * 2, 0.05)
+        self._forward(signal.SIGKILL)
+        for pid in list(self._pids):
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+            del self._pids[pid]
+
+    def run(self, daemon=False):
+        """
+        Starts the workers and supervises them until SIGTERM, SIGINT
+        or stop(). With daemon the process daemonizes first (only
+        the listening socket's fd is kept open).
+        """
+        import selectors
+        import signal
+
+        if daemon:
+            daemonize([self.socket.fileno()] if self.socket is not None else ())
+
+        read, write = self._pipe = os.pipe()
+        os.set_blocking(read, False)
+        os.set_blocking(write, False)
+        handled = (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGUSR1, signal.SIGUSR2, signal.SIGCHLD)
+        handlers = {signum: signal.signal(signum, self._on_signal) for signum in handled}
+        old_wakeup = signal.set_wakeup_fd(write)
+        self._stopping = False
+        try:
+            with selectors.DefaultSelector() as selector:
+                selector.register(read, selectors.EVENT_READ)
+                self._pending = dict.fromkeys(range(self.workers), 0)
+                while True:
+                    while self._signals:
+                        signum = self._signals.popleft()
+                        if signum in (signal.SIGTERM, signal.SIGINT):
+                            self._stopping = True
+                        elif signum != signal.SIGCHLD:
+                            self._forward(signum)
+                    if self._stopping:
+                        break
+                    self._collect()
+                    now = time.monotonic()
+                    for slot, when in list(self._pending.items()):
+                        if when <= now:
+                            del self._pending[slot]
+                            if slot in self._started:
+                                self.restarts += 1
+                            self._spawn(slot, handled)
+                    timeout = max(min(self._pending.values()) - now, 0) if self._pending else None
+                    if selector.select(timeout):
+                        try:
+                            os.read(read, 4096)
+                        except BlockingIOError:
+                            pass
+            self._shutdown()
+        finally:
+            signal.set_wakeup_fd(old_wakeup)
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+            os.close(read)
+            os.close(write)
+            self._pipe = None
+
+
+def _iter_lines(file, limit=None, chunk=1 << 20):
+    """
+    Yields the lines of a binary file one at a time, reading at
+    most limit bytes. The data ends at the first NUL, where the
+    padding of an unfinished preallocated segment starts.
+    """
+    rest = b''
+    while limit is None or limit > 0:
+        data = file.read(chunk if limit is None else min(chunk, limit))
+        if not data:
+            break
+        if limit is not None:
+            limit -= len(data)
+        end = data.find(b'\0')
+        if end >= 0:
+            data = data[:end]
+            limit = 0
+        lines = (rest + data).split(b'\n')
+        rest = lines.pop()
+        for line in lines:
+            yield line.decode('utf-8', 'replace') + '\n'
+    if rest:
+        yield rest.decode('utf-8', 'replace')
+
+
+class RotatingFileSink(object):
+    """
+    A file-like object for Logger.config(file=...) that writes to
+    numbered segments (path.000001, path.000002, ...) instead of
+    one ever-growing file.
+
+    Each segment is preallocated and written through an mmap, so
+    a write is a memory copy and flush() costs nothing: the data
+    is in the page cache and survives the process dying. sync()
+    forces it to disk. When a segment is closed it is cut down to
+    what was written.
+
+     path - Where the segments go
+     max_bytes - Rotate once a segment holds this many bytes
+     max_age - Rotate once a segment is this many seconds old
+     backups - How many closed segments to keep (None for all)
+     compress - gzip closed segments in a worker thread
+    """
+    def __init__(self, path, max_bytes=64 * 1024 * 1024, max_age=None, backups=None, compress=False):
+        import threading
+
+        if max_bytes < 1:
+            raise ValueError("max_bytes must be at least 1!")
+        self.path = os.path.abspath(path)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.backups = backups
+        self.compress = compress
+        self._fd = None
+        self._map = None
+        self._size = 0
+        self._pos = 0
+        self._deadline = None
+        self._compressor = None
+        self._jobs = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        segments = self.segments()
+        self._index = segments[-1][0] if segments else 0
+        self._last_closed = self._index
+        self._open_segment(0)
+
+    def __repr__(self):
+        return f'<RotatingFileSink {self.path!r} segment {self._index}>'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def writable(self):
+        return True
+
+    def _segment_path(self, index):
+        return f'{self.path}.{index:06d}'
+
+    def segments(self):
+        """
+        Returns the (index, filename) of every segment on disk,
+        oldest first, the one being written included.
+        """
+        directory, base = os.path.split(self.path)
+        found = {}
+        for name in os.listdir(directory):
+            if not name.startswith(base + '.'):
+                continue
+            suffix = name[len(base) + 1:]
+            compressed = suffix.endswith('.gz')
+            if compressed:
+                suffix = suffix[:-3]
+            if len(suffix) < 6 or not suffix.isdigit():
+                continue
+            index = int(suffix)
+            # While a segment is being compressed both files exist,
+            # the plain one is complete until it is removed.
+            if not compressed or index not in found:
+                found[index] = os.path.join(directory, name)
+        return sorted(found.items())
+
+    def _open_segment(self, length):
+        import mmap
+
+        self._index += 1
+        self._size = max(self.max_bytes, length)
+        self._fd = os.open(self._segment_path(self._index), os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.posix_fallocate(self._fd, 0, self._size)
+        except (AttributeError, OSError):
+            os.ftruncate(self._fd, self._size)
+        self._map = mmap.mmap(self._fd, self._size)
+        self._pos = 0
+        if self.max_age is not None:
+            self._deadline = time.monotonic() + self.max_age
+
+    def _close_segment(self):
+        self._map.close()
+        os.ftruncate(self._fd, self._pos)
+        os.close(self._fd)
+        self._map = self._fd = None
+        if not self._pos:
+            os.remove(self._segment_path(self._index))
+            return
+
+        index = self._index
+        self._check_jobs()
+        with self._lock:
+            self._last_closed = index
+            self._prune(index)
+        if not self.compress or self.backups == 0:
+            return
+        if self._compressor is None:
+            from concurrent.futures import ThreadPoolExecutor
+
+            self._compressor = ThreadPoolExecutor(1, thread_name_prefix='club.RotatingFileSink')
+        self._jobs.append(self._compressor.submit(self._retire, index))
+
+    def _check_jobs(self):
+        """
+        Raises what went wrong in the compression worker, if anything.
+        """
+        done = [job for job in self._jobs if job.done()]
+        for job in done:
+            self._jobs.remove(job)
+        for job in done:
+            job.result()
+
+    def _kept(self, index):
+        return self.backups is None or index > self._last_closed - self.backups
+
+    def _prune(self, index):
+        """
+        Removes the closed segments older than the last backups,
+        queued or half compressed ones too (the worker drops those).
+        """
+        if self.backups is None:
+            return
+        for old, _ in self.segments():
+            if old > index - self.backups:
+                break
+            for name in (self._segment_path(old), self._segment_path(old) + '.gz'):
+                try:
+                    os.remove(name)
+                except FileNotFoundError:
+                    pass
+
+    def _retire(self, index):
+        import gzip
+        import shutil
+
+        name = self._segment_path(index)
+        try:
+            source = open(name, 'rb')
+        except FileNotFoundError:
+            # Pruned before its turn came.
+            return
+        with source, gzip.open(name + '.gz.tmp', 'wb') as target:
+            shutil.copyfileobj(source, target, 1 << 20)
+        # The writer prunes under the same lock, so a segment is never
+        # put back after it was pruned while it was being compressed.
+        with self._lock:
+            if self._kept(index):
+                os.replace(name + '.gz.tmp', name + '.gz')
+                os.remove(name)
+            else:
+                os.remove(name + '.gz.tmp')
+
+    def rotate(self, length=0):
+        """
+        Closes the current segment and starts the next one.
+        """
+        self._close_segment()
+        self._open_segment(length)
+
+    def write(self, text):
+        if self._closed:
+            raise ValueError("I/O operation on closed RotatingFileSink!")
+        data = text.encode('utf-8') if type(text) is str else text
+        end = self._pos + len(data)
+        if end > self._size or (self._deadline is not None and time.monotonic() >= self._deadline):
+            self.rotate(len(data))
+            end = len(data)
+        self._map[self._pos:end] = data
+        self._pos = end
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def sync(self):
+        """
+        Writes the current segment through to the disk.
+        """
+        if self._map is not None:
+            self._map.flush()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._close_segment()
+        if self._compressor is not None:
+            self._compressor.shutdown(wait=True)
+            self._compressor = None
+            self._check_jobs()
+
+    def lines(self):
+        """
+        Yields every line kept in the segments, oldest first,
+        without reading more than a chunk of them into memory.
+        """
+        for file, limit in self._open_segments():
+            with file:
+                yield from _iter_lines(file, limit)
+
+    def records(self, start=None, stop=None):
+        """
+        Yields the records a structured Logger packed into the
+        segments, see read_log().
+        """
+        for file, limit in self._open_segments():
+            with file:
+                yield from read_log(file, start, stop)
+
+    def _open_segments(self):
+        import gzip
+
+        for index, name in self.segments():
+            limit = self._pos if index == self._index and not self._closed else None
+            try:
+                file = gzip.open(name, 'rb') if name.endswith('.gz') else open(name, 'rb')
+            except FileNotFoundError:
+                # Compressed (or dropped) in the meantime.
+                if name.endswith('.gz'):
+                    continue
+                try:
+                    file = gzip.open(name + '.gz', 'rb')
+                except FileNotFoundError:
+                    continue
+            yield file, limit
+
+
+_LOG_TOKENS = ('{asctime}', '{utime}', '{line}')
+# Header of a packed record: timestamp, line and message length.
+_LOG_RECORD = '<dII'
+
+
+def _log_message(text, args):
+    return str(text).format(*args) if args else str(text)
+
+
+def read_log(file, start=None, stop=None):
+    """
+    Yields the (timestamp, line, message) records a structured
+    Logger wrote to a binary file (a path or a file opened with
+    'rb'), only those logged at start <= timestamp < stop. Only
+    the headers of the other records are read, their messages
+    are skipped without being decoded.
+    """
+    import struct
+
+    if isinstance(file, (str, bytes, os.PathLike)):
+        with open(file, 'rb') as file:
+            yield from read_log(file, start, stop)
+        return
+
+    data = b''
+    if isinstance(file, (io.BufferedReader, io.FileIO)):
+        import mmap
+
+        try:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty file.
+            pass
+    else:
+        data = file.read()
+
+    header = struct.Struct(_LOG_RECORD)
+    unpack = header.unpack_from
+    size = header.size
+    pos = 0
+    end = len(data)
+    try:
+        while pos + size <= end:
+            when, line, length = unpack(data, pos)
+            if not line:
+                # The unwritten rest of a preallocated segment.
+                break
+            pos += size
+            if (start is None or when >= start) and (stop is None or when < stop):
+                yield when, line, str(data[pos:pos + length], 'utf-8', 'replace')
+            pos += length
+    finally:
+        if not isinstance(data, bytes):
+            data.close()
 
 
 class Logger(object):
     """
     Used as a simpler logging object.
+
+    Options (given to config()):
+     file - Where the records are written (stdout by default)
+     format - Put in front of every record, "{asctime}", "{utime}"
+              and "{line}" (the number of the record) are filled in
+     history - How many records get_log_history() keeps (None
+               for all of them, ignored for a RotatingFileSink,
+               which keeps its own)
+     buffering - Write and flush once per this many records
+     background - Write from a background thread, so log()
+                  never waits for the file
+     structured - Keep the records as (timestamp, line, text,
+                  args) and only format them when they are read.
+                  Binary files (and RotatingFileSinks) get packed
+                  records that read_log() reads back, text files
+                  still get the formatted lines
     """
     def __init__(self, file=sys.stdout):
         self.file = file
-        self.logged_text = ''
         self.format = ''
+        self.history = 10000
+        self.buffering = 1
+        self.background = False
+        self.structured = False
+        self._lines = 0
+        self._records = deque(maxlen=0 if isinstance(file, RotatingFileSink) else self.history)
+        self._pending = []
+        self._queue = None
+        self._wake = None
+        self._thread = None
+        self._second = None
+        self._asctime = ''
+        self._packer = None
+        self._empty = ''
+        self._compile()
 
-    def __enter__(self, file=sys.stdout):
-        self.__init__(file)
+    def __enter__(self):
+        return self
 
-    def __exit__(self):
+    def __exit__(self, exc_type, exc_value, traceback):
         self.close()
     
     def config(self, **kwargs):
+        for key in kwargs:
+            if key not in ('file', 'format', 'history', 'buffering', 'background', 'structured'):
+                raise TypeError(f"Unknown Logger option {key!r}!")
+
+        background = self._thread is not None
+        if background:
+            self._stop_writer()
+        else:
+            self.flush()
+
         if 'file' in kwargs:
             self.file = kwargs['file']
         if 'format' in kwargs:
             self.format = kwargs['format']
-    
-    def _parse_format(self):
-        formatted = self.format
-        if '{asctime}' in self.format:
-            formatted = formatted.replace('{asctime}',time.ctime())
-        if '{utime}' in self.format:
-            formatted = formatted.replace('{utime}',str(time.time()))
-        if '{line}' in self.format:
-            formatted = formatted.replace('{line}',str(len(self.logged_text.split('\n')) + 1))
-        return formatted
+            self._compile()
+        if 'history' in kwargs:
+            self.history = kwargs['history']
+        if isinstance(self.file, RotatingFileSink):
+            # The segments are the history.
+            self._records = deque(maxlen=0)
+        elif 'history' in kwargs or self._records.maxlen == 0:
+            self._records = deque(self._records, maxlen=self.history)
+        if 'buffering' in kwargs:
+            self.buffering = max(int(kwargs['buffering']), 1)
+        if 'background' in kwargs:
+            self.background = bool(kwargs['background'])
+        if 'structured' in kwargs:
+            self.structured = bool(kwargs['structured'])
+
+        self._packer = None
+        self._empty = ''
+        if self.structured and not isinstance(self.file, io.TextIOBase):
+            import struct
+
+            self._packer = struct.Struct(_LOG_RECORD).pack
+            self._empty = b''
+
+        if self.background:
+            self._start_writer()
+
+    def _compile(self):
+        """
+        Splits the format into a str.format() template
+        and the set of tokens it uses, once per config().
+        """
+        import re
+
+        parts = re.split('(' + '|'.join(map(re.escape, _LOG_TOKENS)) + ')', self.format)
+        self._fields = frozenset(part[1:-1] for part in parts if part in _LOG_TOKENS)
+        self._template = ''.join(
+            part if part in _LOG_TOKENS else part.replace('{', '{{').replace('}', '}}') for part in parts
+        )
+
+    def _parse_format(self, now=None, line=None):
+        fields = self._fields
+        if not fields:
+            return self.format
+
+        values = {}
+        if 'asctime' in fields or 'utime' in fields:
+            if now is None:
+                now = time.time()
+            if 'asctime' in fields:
+                # ctime() only changes once a second.
+                second = int(now)
+                if second != self._second:
+                    self._second, self._asctime = second, time.ctime(now)
+                values['asctime'] = self._asctime
+            if 'utime' in fields:
+                values['utime'] = str(now)
+        if 'line' in fields:
+            values['line'] = self._lines if line is None else line
+        return self._template.format_map(values)
+
+    def _emit(self, data):
+        if self._queue is not None:
+            # deque.append() is atomic, the writer is only woken up
+            # when it went to sleep on an empty queue.
+            self._queue.append(data)
+            if not self._wake.is_set():
+                self._wake.set()
+        elif self.buffering == 1:
+            self.file.write(data)
+            self.file.flush()
+        else:
+            pending = self._pending
+            pending.append(data)
+            if len(pending) >= self.buffering:
+                self.file.write(self._empty.join(pending))
+                pending.clear()
+                self.file.flush()
+
+    def _start_writer(self):
+        import threading
+
+        self._queue = deque()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._writer, args=(self._queue, self._wake, self.file, self._empty), name='club.Logger', daemon=True)
+        self._thread.start()
+
+    def _stop_writer(self):
+        self._emit(None)
+        self._thread.join()
+        self._queue = self._wake = self._thread = None
+
+    @staticmethod
+    def _writer(records, wake, file, empty):
+        # Besides records the queue carries None (stop) and
+        # Events that flush() waits on.
+        popleft = records.popleft
+        kind = type(empty)
+        while True:
+            wake.wait()
+            wake.clear()
+            batch = []
+            while records:
+                item = popleft()
+                if type(item) is kind:
+                    batch.append(item)
+                    continue
+                if batch:
+                    file.write(empty.join(batch))
+                    batch = []
+                file.flush()
+                if item is None:
+                    return
+                item.set()
+            if batch:
+                file.write(empty.join(batch))
+                file.flush()
+
+    def flush(self):
+        """
+        Writes out everything logged so far.
+        """
+        if self._queue is not None:
+            import threading
+
+            done = threading.Event()
+            self._emit(done)
+            done.wait()
+            return
+        if self._pending:
+            self.file.write(self._empty.join(self._pending))
+            self._pending.clear()
+        self.file.flush()
             
     def close(self):
-        if not self.file == sys.stdout:
+        if self._thread is not None:
+            self._stop_writer()
+        self.flush()
+        if self.file not in (sys.stdout, sys.stderr, sys.__stdout__, sys.__stderr__):
             self.file.close()
-        else:
-            self.file.flush()
-        return self.logged_text
+        return self.get_log_history()
     
-    def log(self, text):
-        log = self._parse_format(self)
-        log += str(text)
-        self.file.write(log)
-        self.file.flush()
-        self.logged_text += log
-        self.logged_text += '\n'
+    def log(self, text, *args):
+        """
+        Logs text, formatted with str.format(*args) if any args
+        are given. Returns the line written, or the raw record
+        in structured mode.
+        """
+        self._lines += 1
+        if self.structured:
+            record = (time.time(), self._lines, text, args)
+            self._records.append(record)
+            if self._packer is not None:
+                message = _log_message(text, args).encode('utf-8')
+                self._emit(self._packer(record[0], record[1], len(message)) + message)
+            else:
+                self._emit(self._parse_format(record[0], record[1]) + _log_message(text, args) + '\n')
+            return record
+
+        log = self._parse_format() + _log_message(text, args)
+        self._records.append(log)
+        self._emit(log + '\n')
         return log
+
+    def records(self, start=None, stop=None):
+        """
+        Yields the (timestamp, line, message) of the records kept
+        by a structured Logger, only those logged at
+        start <= timestamp < stop.
+        """
+        if not self.structured:
+            raise Exception("records() needs a structured Logger!")
+        if isinstance(self.file, RotatingFileSink):
+            self.flush()
+            yield from self.file.records(start, stop)
+            return
+        for when, line, text, args in self._records:
+            if (start is None or when >= start) and (stop is None or when < stop):
+                yield when, line, _log_message(text, args)
     
-    def get_log_history(self):
-        return self.logged_text
+    def get_log_history(self, stream=False):
+        """
+        Returns the records kept so far as one string, or with
+        stream=True as an iterator over them (line by line). When
+        logging to a RotatingFileSink they are read back from its
+        segments.
+        """
+        if self.structured:
+            parse = self._parse_format
+            lines = (parse(when, line) + message + '\n' for when, line, message in self.records())
+        elif isinstance(self.file, RotatingFileSink):
+            self.flush()
+            lines = self.file.lines()
+        else:
+            lines = (record + '\n' for record in self._records)
+        return lines if stream else ''.join(lines)
+
+    @property
+    def logged_text(self):
+        return self.get_log_history()
@@ -0,0 +1,26 @@
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import club
+
+
+def test_put_past_right_edge():
+    screen = club.Screen(10, 3, file=io.StringIO())
+    screen.put(12, 0, 'abcdefgh')
+    screen.put(15, 2, 'abcdefgh')
+    screen.put(10, 1, 'x')
+    assert len(screen._chars) == len(screen._styles) == 30
+    assert all(screen.get(x, y) == (' ', '') for x in range(10) for y in range(3))
+
+
+def test_put_clips_at_right_edge():
+    screen = club.Screen(10, 3, file=io.StringIO())
+    screen.put(7, 0, 'abcdefgh')
+    screen.put(-2, 2, 'abcdefghijklmnop')
+    assert ''.join(screen.get(x, 0)[0] for x in range(10)) == '       abc'
+    assert screen.get(0, 1) == (' ', '')
+    assert ''.join(screen.get(x, 2)[0] for x in range(10)) == 'cdefghijkl'
+    assert len(screen._chars) == 30